@@ -0,0 +1,140 @@
+import asyncio
+import time
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.service.credentials import MeliTokenProvider, meli_credentials
+from app.service.meli_client import get_client
+from app.settings.config import MELI_ACCOUNTS
+
+SCAN_PAGE_SIZE = 100
+
+SECRET_IDS = [secret_id.strip() for secret_id in MELI_ACCOUNTS.split(",") if secret_id.strip()]
+# Se decide por lo configurado, no por las cuentas que resolvieron: las filas no cambian de forma si una cae
+MULTI_ACCOUNT = len(SECRET_IDS) > 1
+
+# Con varias cuentas las filas llevan ademas el vendedor (requiere la columna en las tablas destino)
+SELLER_COLUMN = ("seller_id", "bigint")
+
+
+class MeliAccount:
+    """
+    Cuenta de vendedor: token propio y MeliClient propio, asi cada cuenta
+    tiene sus token buckets y su limite AIMD y un 429 en una no frena a las otras.
+    """
+
+    def __init__(self, name, credentials):
+        self.name = name
+        self.credentials = credentials
+        self.client = get_client(credentials)
+        self.seller_id = None
+        # etapa -> [items, momento del ultimo chunk terminado]
+        self._throughput = {}
+        self._item_ids = None
+
+    async def resolve_seller(self):
+        data, _ = await self.client.get_json("/users/me")
+        self.seller_id = (data or {}).get("id")
+        if self.seller_id is None:
+            logger.error(f"Account {self.name}: could not resolve seller id")
+        return self
+
+    def item_ids(self):
+        """Ids de todas las publicaciones del vendedor (scan de /items/search, una vez por proceso)."""
+        if self._item_ids is None:
+            self._item_ids = asyncio.ensure_future(self._scan_item_ids())
+        return self._item_ids
+
+    async def _scan_item_ids(self):
+        path = f"/users/{self.seller_id}/items/search"
+        params = {"search_type": "scan", "limit": SCAN_PAGE_SIZE}
+        item_ids = []
+        while True:
+            data, status = await self.client.get_json(path, params=params)
+            if data is None:
+                raise RuntimeError(f"Account {self.name}: items scan failed with status {status}")
+            if not data.get("results"):
+                break
+            item_ids.extend(data["results"])
+            params["scroll_id"] = data.get("scroll_id")
+        logger.info(f"Account {self.name} ({self.seller_id}): {len(item_ids)} items")
+        return item_ids
+
+    def track(self, stage, count):
+        entry = self._throughput.setdefault(stage, [0, None])
+        entry[0] += count
+        entry[1] = time.perf_counter()
+
+    def report(self, stage, started):
+        items, finished = self._throughput.get(stage, (0, None))
+        duration = (finished or started) - started
+        rate = items / duration if duration > 0 else 0
+        metrics.inc("account_items_total", items, stage=stage, seller=self.seller_id)
+        logger.info(f"{stage} account {self.name} ({self.seller_id}): {items} items in {duration:.2f}s ({rate:.1f} items/s)")
+        self.client.report()
+
+
+def drop_account(account, step, error):
+    logger.error(f"Account {account.name}: dropped, {step} failed: {error}")
+    metrics.inc("accounts_failed_total", account=account.name, step=step)
+
+
+async def resolve_accounts(accounts):
+    """Resuelve el seller_id de cada cuenta; las que fallan se descartan y sigue el resto."""
+    results = await asyncio.gather(*[account.resolve_seller() for account in accounts], return_exceptions=True)
+    resolved = []
+    for account, result in zip(accounts, results):
+        if isinstance(result, Exception):
+            drop_account(account, "resolve", result)
+        elif account.seller_id is None:
+            drop_account(account, "resolve", "no seller id")
+        else:
+            resolved.append(account)
+    if not resolved:
+        raise RuntimeError("No Meli account could be resolved")
+    return resolved
+
+
+_accounts = None
+
+
+def load_accounts():
+    """
+    Cuentas configuradas en MELI_ACCOUNTS (ids de secretos separados por coma),
+    con el seller_id ya resuelto. Sin MELI_ACCOUNTS es solo la cuenta de SECRET_ID.
+    Todas las etapas comparten las mismas cuentas (y sus limites); las que no
+    se pueden resolver quedan afuera.
+    """
+    global _accounts
+    if _accounts is None:
+        if SECRET_IDS:
+            accounts = [MeliAccount(secret_id, MeliTokenProvider(secret_id)) for secret_id in SECRET_IDS]
+        else:
+            accounts = [MeliAccount("default", meli_credentials)]
+        _accounts = asyncio.ensure_future(resolve_accounts(accounts))
+    return _accounts
+
+
+async def item_owners(accounts):
+    """
+    Funcion item_id -> cuenta. Con una sola cuenta todo va a esa cuenta; con
+    varias se usa el scan de items de cada vendedor, y los items que no
+    aparecen en ningun scan quedan en la primera cuenta. Una cuenta cuyo scan
+    falla no recibe items.
+    """
+    if len(accounts) == 1:
+        return lambda item_id: accounts[0]
+
+    owners = {}
+    scanned = []
+    results = await asyncio.gather(*[account.item_ids() for account in accounts], return_exceptions=True)
+    for account, item_ids in zip(accounts, results):
+        if isinstance(item_ids, Exception):
+            drop_account(account, "scan", item_ids)
+            continue
+        scanned.append(account)
+        for item_id in item_ids:
+            owners[item_id] = account
+    if not scanned:
+        raise RuntimeError("Items scan failed for every Meli account")
+    default = scanned[0]
+    return lambda item_id: owners.get(item_id, default)
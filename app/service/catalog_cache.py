@@ -0,0 +1,114 @@
+import asyncio
+import json
+import time
+from app.utils.logger import logger
+from app.utils.local_store import open_store
+from app.settings.config import CATALOG_CACHE_TTL, CATALOG_CACHE_MAX_ENTRIES
+
+
+class CatalogCache:
+    """
+    Cache de /products/{catalog_product_id}/items.
+
+    - Dentro de una corrida: un solo request en vuelo por catalog_product_id,
+      los demas items que comparten el producto esperan el mismo resultado.
+    - Entre corridas: SQLite local con TTL y limite de entradas (se expulsan
+      las mas viejas).
+
+    Solo se guarda lo que usa el sync: pares (item_id, seller_id).
+    """
+
+    def __init__(self, ttl=CATALOG_CACHE_TTL, max_entries=CATALOG_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.run_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+        self._inflight = {}
+        self._results = {}
+        self._dirty = {}
+
+        self._conn = open_store("catalog_cache")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_items (
+                catalog_product_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        rows = self._conn.execute(
+            "SELECT catalog_product_id, payload FROM catalog_items WHERE fetched_at >= ?",
+            (time.time() - self.ttl,)
+        ).fetchall()
+        self._stored = {key: json.loads(payload) for key, payload in rows}
+        logger.info(f"Catalog cache loaded with {len(self._stored)} valid entries")
+
+    async def get(self, catalog_product_id, fetch):
+        """
+        Devuelve la lista de competidores [{"item_id", "seller_id"}] o None.
+        `fetch` es una corrutina sin argumentos que trae el payload crudo de la API.
+        """
+        if catalog_product_id in self._results:
+            self.run_hits += 1
+            return self._results[catalog_product_id]
+
+        if catalog_product_id in self._inflight:
+            self.run_hits += 1
+            return await self._inflight[catalog_product_id]
+
+        if catalog_product_id in self._stored:
+            self.store_hits += 1
+            result = self._stored[catalog_product_id]
+            self._results[catalog_product_id] = result
+            return result
+
+        self.misses += 1
+        task = asyncio.ensure_future(self._resolve(catalog_product_id, fetch))
+        self._inflight[catalog_product_id] = task
+        try:
+            return await task
+        finally:
+            self._inflight.pop(catalog_product_id, None)
+
+    async def _resolve(self, catalog_product_id, fetch):
+        catalog_data = await fetch()
+        if not catalog_data:
+            # No se cachean errores, se reintenta en la proxima corrida
+            return None
+
+        result = [
+            {"item_id": c.get("item_id"), "seller_id": c.get("seller_id")}
+            for c in catalog_data.get("results", [])
+        ]
+        self._results[catalog_product_id] = result
+        self._dirty[catalog_product_id] = result
+        return result
+
+    def close(self):
+        """Persiste lo nuevo, aplica TTL y limite de tamaño, y reporta hits/misses."""
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO catalog_items VALUES (?, ?, ?)",
+                [(key, json.dumps(value), now) for key, value in self._dirty.items()]
+            )
+            self._conn.execute(
+                "DELETE FROM catalog_items WHERE fetched_at < ?",
+                (now - self.ttl,)
+            )
+            self._conn.execute("""
+                DELETE FROM catalog_items WHERE catalog_product_id IN (
+                    SELECT catalog_product_id FROM catalog_items
+                    ORDER BY fetched_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+        self._conn.close()
+
+        total = self.run_hits + self.store_hits + self.misses
+        ratio = (total - self.misses) / total * 100 if total else 0
+        logger.info(
+            f"Catalog cache: {self.run_hits} run hits, {self.store_hits} store hits, "
+            f"{self.misses} misses ({ratio:.1f}% hit ratio)"
+        )
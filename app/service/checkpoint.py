@@ -0,0 +1,80 @@
+import json
+import pickle
+import time
+from app.utils.logger import logger
+from app.utils.local_store import open_store
+from app.settings.config import RUN_ID, CHECKPOINT_ENABLED, CHECKPOINT_MAX_AGE
+
+
+class RunJournal:
+    """
+    Journal local de una etapa para poder retomar una corrida que fallo a mitad.
+
+    Cada chunk terminado se guarda con sus ids y las filas ya obtenidas (pickle);
+    al relanzar con el mismo RUN_ID esos ids se saltean y sus filas se suman
+    al resultado. Se borra con `clear()` una vez que la escritura en la DB salio bien.
+    Las entradas de mas de CHECKPOINT_MAX_AGE horas se descartan.
+    """
+
+    def __init__(self, stage, run_id=RUN_ID, enabled=CHECKPOINT_ENABLED):
+        self.stage = stage
+        self.run_id = run_id
+        self.enabled = bool(enabled)
+        self.done_ids = set()
+        self.rows = []
+        self.meta = {}
+        self.resumed_chunks = 0
+        if not self.enabled:
+            return
+
+        self._conn = open_store("checkpoint")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                stage TEXT NOT NULL,
+                run_id TEXT NOT NULL,
+                ids TEXT NOT NULL,
+                rows BLOB NOT NULL,
+                meta TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM chunks WHERE created_at < ? OR (stage = ? AND run_id != ?)",
+                (time.time() - CHECKPOINT_MAX_AGE * 3600, stage, run_id)
+            )
+        for ids, rows, meta in self._conn.execute(
+            "SELECT ids, rows, meta FROM chunks WHERE stage = ? AND run_id = ?", (stage, run_id)
+        ):
+            self.done_ids.update(json.loads(ids))
+            self.rows.extend(pickle.loads(rows))
+            if meta:
+                self.meta.update(json.loads(meta))
+            self.resumed_chunks += 1
+
+        if self.resumed_chunks:
+            logger.info(
+                f"Resuming {stage} run {run_id}: {self.resumed_chunks} chunks, "
+                f"{len(self.done_ids)} items already fetched"
+            )
+
+    def record(self, ids, rows, meta=None):
+        if not self.enabled:
+            return
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+                (self.stage, self.run_id, json.dumps(list(ids)), pickle.dumps(list(rows)),
+                 json.dumps(meta) if meta else None, time.time())
+            )
+
+    def clear(self):
+        if not self.enabled:
+            return
+        with self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE stage = ?", (self.stage,))
+        logger.info(f"Checkpoint journal for {self.stage} cleared")
+
+    def close(self):
+        if self.enabled:
+            self._conn.close()
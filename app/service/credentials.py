@@ -0,0 +1,132 @@
+import abc
+import asyncio
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.settings.config import SCOPES, SECRET_ID, MELI_TOKEN_TTL, MELI_STATIC_TOKEN, TOKEN_REFRESH_MARGIN
+
+
+class TokenProvider(abc.ABC):
+    """
+    Token cacheado hasta poco antes de expirar.
+
+    `get()` devuelve el token vigente y lo renueva fuera del event loop si
+    hace falta; `refresh(stale)` fuerza la renovacion tras un 401, salvo que
+    otra tarea ya lo haya renovado mientras tanto.
+    """
+
+    def __init__(self, margin=TOKEN_REFRESH_MARGIN):
+        self.margin = margin
+        self.token = None
+        self.expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @abc.abstractmethod
+    def _fetch(self):
+        """Bloqueante. Devuelve (token, expires_at epoch)."""
+
+    async def get(self):
+        if self.token and time.time() < self.expires_at - self.margin:
+            return self.token
+        async with self._lock:
+            if not self.token or time.time() >= self.expires_at - self.margin:
+                self.token, self.expires_at = await asyncio.to_thread(self._fetch)
+        return self.token
+
+    async def refresh(self, stale_token):
+        async with self._lock:
+            if self.token == stale_token:
+                logger.info(f"{type(self).__name__}: refreshing rejected token")
+                self.token, self.expires_at = await asyncio.to_thread(self._fetch)
+        return self.token
+
+
+class MeliTokenProvider(TokenProvider):
+    """Token de Meli desde Secret Manager; se vuelve a leer cada MELI_TOKEN_TTL segundos."""
+
+    def __init__(self, secret_id=SECRET_ID, ttl=MELI_TOKEN_TTL):
+        super().__init__()
+        self.secret_id = secret_id
+        self.ttl = ttl
+
+    def _fetch(self):
+        from app.service.secrets import meli_secrets
+        token = meli_secrets(self.secret_id)
+        if not token:
+            raise RuntimeError(f"Empty Meli token in secret {self.secret_id}")
+        return token, time.time() + self.ttl
+
+
+class GoogleTokenProvider(TokenProvider):
+    """Token de ADC; las credenciales se crean una vez y se refrescan segun su `expiry`."""
+
+    def __init__(self, scopes=None):
+        super().__init__()
+        self.scopes = scopes or [SCOPES]
+        self._creds = None
+
+    def _fetch(self):
+        import google.auth
+        from google.auth.transport.requests import Request
+
+        if self._creds is None:
+            self._creds, _ = google.auth.default(scopes=self.scopes)
+        self._creds.refresh(Request())
+        if not self._creds.token:
+            raise RuntimeError("No se pudo obtener el token de acceso desde el entorno.")
+
+        expiry = self._creds.expiry
+        if expiry is None:
+            expires_at = time.time() + 3600
+        else:
+            # google-auth usa datetimes naive en UTC
+            expires_at = expiry.replace(tzinfo=timezone.utc).timestamp()
+        logger.info(f"Credenciales ADC renovadas, expiran {datetime.fromtimestamp(expires_at, timezone.utc):%H:%M:%S} UTC")
+        return self._creds.token, expires_at
+
+
+class StaticTokenProvider(TokenProvider):
+    """Token fijo (stubs locales y benchmarks)."""
+
+    def __init__(self, token):
+        super().__init__(margin=0)
+        self.token = token
+        self.expires_at = float("inf")
+
+    def _fetch(self):
+        return self.token, self.expires_at
+
+
+def google_endpoint(url):
+    """/drive/v3/files/... -> files, /batch/drive/v3 -> batch (label de metricas)."""
+    parts = urlsplit(url).path.strip("/").split("/")
+    if parts[0] == "batch":
+        return "batch"
+    return parts[2] if len(parts) > 2 else parts[-1]
+
+
+async def authorized_request(session, credentials, method, url, headers=None, **kwargs):
+    """
+    Request con `Authorization: Bearer` del provider. Ante un 401 renueva el
+    token una vez y repite. Devuelve (status, headers, body_text).
+    """
+    token = await credentials.get()
+    endpoint = google_endpoint(url)
+    for attempt in range(2):
+        request_headers = {**(headers or {}), "Authorization": f"Bearer {token}"}
+        started = time.perf_counter()
+        async with session.request(method, url, headers=request_headers, **kwargs) as resp:
+            body = await resp.text()
+            metrics.observe("http_request_seconds", time.perf_counter() - started, service="google", endpoint=endpoint)
+            metrics.inc("http_requests_total", service="google", endpoint=endpoint, status=resp.status)
+            if resp.status == 401 and attempt == 0:
+                token = await credentials.refresh(token)
+                continue
+            return resp.status, resp.headers, body
+
+
+meli_credentials = StaticTokenProvider(MELI_STATIC_TOKEN) if MELI_STATIC_TOKEN else MeliTokenProvider()
+google_credentials = GoogleTokenProvider()
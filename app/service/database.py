@@ -1,47 +1,150 @@
+import asyncio
+import atexit
+import hashlib
+import io
+import os
+import tempfile
+import time
+import uuid
 from sqlalchemy import create_engine, text, insert
-from google.cloud.sql.connector import Connector
 from app.utils.logger import logger
-from app.settings.config import INSTANCE_DB, USER_DB, PASSWORD_DB, NAME_DB, SCHEMA_INVENTORY
+from app.utils.metrics import metrics
+from app.utils.row_batch import RowBatch
+from app.settings.config import (
+    INSTANCE_DB,
+    USER_DB,
+    PASSWORD_DB,
+    NAME_DB,
+    SCHEMA_INVENTORY,
+    BULK_STRATEGY,
+    BULK_ROWS_PER_STATEMENT,
+    BULK_MERGE_CHUNK_ROWS,
+    DB_LOCAL_INFILE,
+    DB_DSN,
+    DB_ASYNC_DSN,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_FETCH_SIZE,
+    RUN_ID,
+    SHARD_INDEX,
+    SHARD_COUNT,
+    SHARD_MARKER_TABLE,
+    SHARD_LOCK_TIMEOUT,
+)
+
+_connector = None
+
+
+def get_connector():
+    """Un unico Connector de Cloud SQL por proceso, cerrado al salir."""
+    global _connector
+    if _connector is None:
+        # Import diferido: solo hace falta sin DB_DSN y es de lo mas pesado al arrancar
+        from google.cloud.sql.connector import Connector
+        _connector = Connector()
+        atexit.register(_connector.close)
+    return _connector
+
 
 def getconn():
-    connector = Connector() 
-    return connector.connect(
+    return get_connector().connect(
         INSTANCE_DB,
         "pymysql",
         user=USER_DB,
         password=PASSWORD_DB,
         db=NAME_DB,
-    )   
-
-engine = create_engine(
-        "mysql+pymysql://",
-        creator=getconn,
-        pool_pre_ping=True,
-        pool_size=5,
-        max_overflow=2,
+        local_infile=bool(DB_LOCAL_INFILE),
     )
 
+
+def build_engine():
+    pool_options = {
+        "pool_pre_ping": True,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    if DB_DSN:
+        return create_engine(DB_DSN, connect_args={"local_infile": bool(DB_LOCAL_INFILE)}, **pool_options)
+    return create_engine("mysql+pymysql://", creator=getconn, **pool_options)
+
+
+# Se crea en el primer uso (get_engine), no al importar el modulo
+engine = None
+
+
+def get_engine():
+    global engine
+    if engine is None:
+        engine = build_engine()
+    return engine
+
+_async_engine = None
+
+
+def get_async_engine():
+    """
+    Engine async (DB_ASYNC_DSN). El connector de Cloud SQL solo ofrece
+    conexiones async para Postgres, asi que para MySQL se usa un DSN directo
+    (Cloud SQL Auth Proxy o MySQL local). Sin DSN devuelve None y las
+    funciones *_async corren la version sincronica en un thread.
+    """
+    global _async_engine
+    if _async_engine is None and DB_ASYNC_DSN:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        _async_engine = create_async_engine(
+            DB_ASYNC_DSN,
+            pool_pre_ping=True,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    return _async_engine
+
+
+def build_select(data):
+    q_columns = ', '.join(data.get('q_columns'))
+    q_from = data.get('q_from')
+    q_join = data.get('q_join', '')
+    q_where  = data.get('q_where', '')
+    q_limit  = data.get('q_limit', '')
+
+    return text(f"""
+        SELECT 
+        {q_columns} 
+        {q_from} 
+        {q_join} 
+        {q_where} 
+        {q_limit}
+        """)
+
+
+def _select_target(data):
+    """Tabla principal del q_from, como label de metricas."""
+    parts = (data.get('q_from') or '').split()
+    return parts[1] if len(parts) > 1 else 'unknown'
+
+
 def get_method(data):
     """"""
-    with engine.begin() as conn:
+    with get_engine().begin() as conn, metrics.timer("db_seconds", op="select", target=_select_target(data)):
+        result = conn.execute(build_select(data))
+        data = [dict(row) for row in result.mappings()]
+        logger.info("Data extraction completed.")
+        return data
 
-        q_columns = ', '.join(data.get('q_columns'))
-        q_from = data.get('q_from')
-        q_join = data.get('q_join', '')
-        q_where  = data.get('q_where', '')
-        q_limit  = data.get('q_limit', '')
 
-        result = conn.execute(
-            text(f"""
-                SELECT 
-                {q_columns} 
-                {q_from} 
-                {q_join} 
-                {q_where} 
-                {q_limit}
-                """)
-            )
-        data = [dict(row) for row in result.mappings()]
+async def get_method_async(data):
+    """get_method sin bloquear el event loop."""
+    async_engine = get_async_engine()
+    if async_engine is None:
+        return await asyncio.to_thread(get_method, data)
+
+    async with async_engine.connect() as conn:
+        with metrics.timer("db_seconds", op="select", target=_select_target(data)):
+            result = await conn.execute(build_select(data))
+            data = [dict(row) for row in result.mappings()]
         logger.info("Data extraction completed.")
         return data
  
@@ -49,10 +152,42 @@ def get_method(data):
 
 
 
+def iter_method(data, page_size=DB_FETCH_SIZE):
+    """
+    Igual que get_method pero con cursor del lado del servidor: devuelve
+    paginas de tuplas a medida que llegan, sin materializar el resultado completo.
+    """
+    with get_engine().connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=page_size).execute(build_select(data))
+        for partition in result.partitions():
+            yield [tuple(row) for row in partition]
+
+
+async def aiter_method(data, page_size=DB_FETCH_SIZE):
+    """iter_method para corrutinas: cada pagina se trae sin bloquear el event loop."""
+    async_engine = get_async_engine()
+    if async_engine is not None:
+        async with async_engine.connect() as conn:
+            result = await conn.stream(build_select(data))
+            async for partition in result.partitions(page_size):
+                yield [tuple(row) for row in partition]
+        return
+
+    pages = iter_method(data, page_size)
+    try:
+        while True:
+            page = await asyncio.to_thread(next, pages, None)
+            if page is None:
+                return
+            yield page
+    finally:
+        await asyncio.to_thread(pages.close)
+
+
 def load_data(fields:str, data:list, stage:str):
     """"""
     try:
-        with engine.begin() as conn:
+        with get_engine().begin() as conn:
             to_update = ""
             to_update_conflict = ""
             fields_aux = fields.split(',')
@@ -83,7 +218,7 @@ def load_data(fields:str, data:list, stage:str):
 
 def get_items_without_folder():
     """"""
-    with engine.begin() as conn:
+    with get_engine().begin() as conn:
         logger.info("Extracting items with stock from DB")
         result = conn.execute(
             text(f"""
@@ -100,11 +235,26 @@ def get_items_without_folder():
             return None
 
 
+def get_items_without_folder_page(last_id, limit):
+    """Pagina (keyset sobre id) de items con stock y sin drive_url, con id > last_id."""
+    with get_engine().begin() as conn:
+        result = conn.execute(
+            text(f"""
+                SELECT id FROM {SCHEMA_INVENTORY}.product_catalog_sync
+                WHERE drive_url is null and stock >0 and id > :last_id
+                ORDER BY id
+                LIMIT :limit
+            """),
+            {"last_id": last_id, "limit": limit}
+        )
+        return [row[0] for row in result]
+
+
 def load_item_folder_url(data_list):
     """"""
     logger.info("Iniciando proceso de carga de folder urls.")
     try:
-        with engine.begin() as conn:
+        with get_engine().begin() as conn:
             # 1. Crear tabla temporal
             logger.info("Paso 1/3: Creando tabla temporal en el motor de base de datos.")
             conn.execute(text(f"""
@@ -126,14 +276,164 @@ def load_item_folder_url(data_list):
                 INNER JOIN {SCHEMA_INVENTORY}.temp_drive_urls AS source ON target.id = source.item_id
                 SET target.drive_url = source.drive_url
             """))
+            # La conexion vuelve al pool: la tabla temporal no debe sobrevivir al proximo flush
+            conn.execute(text(f"DROP TEMPORARY TABLE {SCHEMA_INVENTORY}.temp_drive_urls"))
     except Exception as e:
         logger.error(f"Error critico en la carga masiva: {str(e)}")
         raise e
 
-import uuid
+# ==========================================================
+# BULK LOAD
+# ==========================================================
+
+def _insert_executemany(conn, temp_table, batch):
+    """Un INSERT por fila via executemany (estrategia original)."""
+    fields = batch.columns
+    conn.exec_driver_sql(
+        f"INSERT INTO {temp_table} ({', '.join(fields)}) VALUES ({', '.join(['%s'] * len(fields))})",
+        list(batch.rows()),
+    )
+
+
+def _insert_multirow(conn, temp_table, batch, rows_per_statement=None):
+    """INSERT con varias filas por sentencia, hasta rows_per_statement filas."""
+    fields = batch.columns
+    rows_per_statement = rows_per_statement or BULK_ROWS_PER_STATEMENT
+    row_placeholder = f"({', '.join(['%s'] * len(fields))})"
+
+    for chunk in batch.iter_chunks(rows_per_statement):
+        params = [value for row in chunk for value in row]
+        conn.exec_driver_sql(
+            f"INSERT INTO {temp_table} ({', '.join(fields)}) VALUES {', '.join([row_placeholder] * len(chunk))}",
+            tuple(params),
+        )
+
+
+def _csv_field(value):
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        value = int(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
 
-def update_method(rows: list[dict], schema: str, table: str):
+def _insert_infile(conn, temp_table, batch):
     """
+    LOAD DATA LOCAL INFILE desde un CSV armado en memoria.
+    PyMySQL solo envia archivos por ruta, asi que el buffer se vuelca
+    a un archivo temporal justo antes de la carga.
+    Requiere DB_LOCAL_INFILE=1 y local_infile habilitado en el servidor.
+    """
+    fields = batch.columns
+    buffer = io.StringIO()
+    for row in batch.rows():
+        buffer.write(",".join(_csv_field(value) for value in row))
+        buffer.write("\n")
+
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, encoding="utf-8") as f:
+        f.write(buffer.getvalue())
+        path = f.name
+
+    try:
+        conn.exec_driver_sql(f"""
+            LOAD DATA LOCAL INFILE '{path}'
+            INTO TABLE {temp_table}
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+            LINES TERMINATED BY '\\n'
+            ({", ".join(fields)})
+        """)
+    finally:
+        os.remove(path)
+
+
+BULK_STRATEGIES = {
+    "executemany": _insert_executemany,
+    "multirow": _insert_multirow,
+    "infile": _insert_infile,
+}
+
+
+def _bulk_update(conn, batch, schema, table, strategy):
+    """Carga `batch` en una tabla temporal y la mergea en schema.table sobre `conn`."""
+    fields = batch.columns
+    temp_table = f"tmp_{table}_{uuid.uuid4().hex[:8]}"
+
+    columns = ["_seq BIGINT AUTO_INCREMENT PRIMARY KEY"]
+
+    for field, value_type in zip(fields, batch.types):
+        columns.append(f"{field} {value_type}")
+
+    create_temp_query = text(f"""
+        CREATE TEMPORARY TABLE {temp_table} (
+            {", ".join(columns)}
+        )
+    """)
+
+    logger.info(f"Updating {len(batch)} records in {schema}.{table} (strategy: {strategy})")
+
+    update_clauses = []
+
+    for field in fields[1:]:
+        update_clauses.append(f"{field} = VALUES({field})")
+
+    merge_query = text(f"""
+        INSERT INTO {schema}.{table}
+        ({", ".join(fields)})
+        SELECT
+            {", ".join(fields)}
+        FROM {temp_table}
+        WHERE _seq BETWEEN :first AND :last
+        ON DUPLICATE KEY UPDATE
+            {", ".join(update_clauses)}
+    """)
+
+    target = f"{schema}.{table}"
+
+    # 1. Create temporary table
+    conn.execute(create_temp_query)
+
+    try:
+        # 2. Load rows into temp table
+        with metrics.timer("db_seconds", op=f"load_{strategy}", target=target):
+            BULK_STRATEGIES[strategy](conn, temp_table, batch)
+            conn.commit()
+
+        # 3. Merge into target table in short transactions
+        total_rows = conn.execute(text(f"SELECT COALESCE(MAX(_seq), 0) FROM {temp_table}")).scalar()
+        updated = 0
+
+        for first in range(1, total_rows + 1, BULK_MERGE_CHUNK_ROWS):
+            with metrics.timer("db_seconds", op="merge", target=target):
+                result = conn.execute(merge_query, {"first": first, "last": first + BULK_MERGE_CHUNK_ROWS - 1})
+                conn.commit()
+            updated += result.rowcount
+
+        metrics.inc("db_rows_total", len(batch), target=target)
+        logger.info(f"Updated {updated} rows")
+    finally:
+        # La conexion vuelve al pool: la tabla temporal no puede quedar viva en ella
+        try:
+            conn.rollback()
+            conn.execute(text(f"DROP TEMPORARY TABLE IF EXISTS {temp_table}"))
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"Could not drop {temp_table}: {e}")
+
+
+def _prepare_bulk(rows, strategy):
+    strategy = strategy or BULK_STRATEGY
+    if strategy not in BULK_STRATEGIES:
+        raise ValueError(f"Unknown bulk strategy: {strategy}")
+    # Assume every row has the same schema
+    batch = rows if isinstance(rows, RowBatch) else RowBatch.from_dicts(rows)
+    return batch, strategy
+
+
+def update_method(rows, schema: str, table: str, strategy: str = None, bind=None):
+    """
+    rows: RowBatch, o el formato legacy de dicts por celda:
+
     rows = [
         {
             "id": {"value": 1, "type": "integer"},
@@ -146,76 +446,49 @@ def update_method(rows: list[dict], schema: str, table: str):
             "active": {"value": False, "type": "boolean"}
         }
     ]
+
+    strategy: "executemany", "multirow" o "infile" (default BULK_STRATEGY).
+    La tabla temporal se carga con la estrategia elegida y luego se mergea
+    en la tabla destino en transacciones de BULK_MERGE_CHUNK_ROWS filas.
     """
 
     if not rows:
         return
 
-    try:
-        # Assume every row has the same schema
-        fields = list(rows[0].keys())
-        id_field = fields[0]
-        temp_table = f"tmp_{table}_{uuid.uuid4().hex[:8]}"
-
-        columns = []
-
-        for field in fields:
-            value_type = rows[0][field]["type"]
-            columns.append(f"{field} {value_type}")
-
-        create_temp_query = text(f"""
-            CREATE TEMPORARY TABLE {temp_table} (
-                {", ".join(columns)}
-            )
-        """)
+    batch, strategy = _prepare_bulk(rows, strategy)
+    bind = bind if bind is not None else get_engine()
 
-        params_list = []
+    try:
+        with bind.connect() as conn:
+            _bulk_update(conn, batch, schema, table, strategy)
 
-        for row in rows:
-            params = {}
-            for field in fields:
-                params[field] = row[field]["value"]
-            params_list.append(params)
+        logger.info("Bulk update completed.")
 
+    except Exception as e:
+        logger.error(
+            f"Error during bulk update: {e}"
+        )
+        raise
 
-        logger.info(f"Updating {len(params_list)} records in {schema}.{table}")
 
+async def update_method_async(rows, schema: str, table: str, strategy: str = None):
+    """update_method sin bloquear el event loop (engine async o thread)."""
+    async_engine = get_async_engine()
+    if async_engine is None:
+        return await asyncio.to_thread(update_method, rows, schema, table, strategy)
 
-        with engine.begin() as conn:
+    if not rows:
+        return
 
-            # 1. Create temporary table
-            conn.execute(create_temp_query)
+    batch, strategy = _prepare_bulk(rows, strategy)
+    if strategy == "infile":
+        # LOAD DATA LOCAL depende del driver sincronico
+        strategy = "multirow"
 
-            # 2. Insert rows into temp table
-            insert_query = text(f"""
-                INSERT INTO {temp_table}
-                ({", ".join(fields)})
-                VALUES
-                ({", ".join([f":{field}" for field in fields])})
-            """)
+    try:
+        async with async_engine.connect() as conn:
+            await conn.run_sync(_bulk_update, batch, schema, table, strategy)
 
-            conn.execute(insert_query, params_list)
-
-            # 3. Update target table from temp table
-            update_clauses = []
-            
-            for field in fields[1:]:
-                update_clauses.append(f"{field} = VALUES({field})")
-            
-            merge_query = text(f"""
-                INSERT INTO {schema}.{table}
-                ({", ".join(fields)})
-                SELECT
-                    {", ".join(fields)}
-                FROM {temp_table}
-                ON DUPLICATE KEY UPDATE
-                    {", ".join(update_clauses)}
-            """)
-            
-            result = conn.execute(merge_query)
-            logger.info(f"Updated {result.rowcount} rows")
-            conn.execute(text(f"DROP TEMPORARY TABLE {temp_table}"))
-            
         logger.info("Bulk update completed.")
 
     except Exception as e:
@@ -229,9 +502,144 @@ def run_procedure(schema, procedure_name):
     """"""
     logger.info(f"Running Procedure {schema}.{procedure_name}()")
     try:
-        with engine.begin() as conn:
+        with get_engine().begin() as conn, metrics.timer("db_seconds", op="procedure", target=f"{schema}.{procedure_name}"):
             conn.execute(text(f"CALL {schema}.{procedure_name}()"))
     except Exception as e:
         logger.error(f"Error running procedure: {str(e)}")
         raise e
-    
\ No newline at end of file
+    
+
+
+async def run_procedure_async(schema, procedure_name):
+    """run_procedure sin bloquear el event loop."""
+    async_engine = get_async_engine()
+    if async_engine is None:
+        return await asyncio.to_thread(run_procedure, schema, procedure_name)
+
+    logger.info(f"Running Procedure {schema}.{procedure_name}()")
+    try:
+        async with async_engine.begin() as conn:
+            with metrics.timer("db_seconds", op="procedure", target=f"{schema}.{procedure_name}"):
+                await conn.execute(text(f"CALL {schema}.{procedure_name}()"))
+    except Exception as e:
+        logger.error(f"Error running procedure: {str(e)}")
+        raise e
+
+
+def _create_marker_table(conn):
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {SHARD_MARKER_TABLE} (
+            run_id VARCHAR(128) NOT NULL,
+            stage VARCHAR(64) NOT NULL,
+            shard_index INT NOT NULL,
+            shard_count INT NOT NULL,
+            finished_at DATETIME NOT NULL,
+            PRIMARY KEY (run_id, stage, shard_index)
+        )
+    """))
+
+
+def _finish_shard(conn, schema, procedure_name, stage, run_id, shard_index, shard_count):
+    """
+    Marca el shard como terminado en SHARD_MARKER_TABLE y, bajo GET_LOCK, el
+    ultimo shard de la corrida corre el procedure y deja una marca shard_index = -1
+    para que no se repita. Devuelve True si el procedure corrio en este shard.
+    """
+    markers = {"run_id": run_id, "stage": stage}
+    lock_name = f"meli_job_{stage}_{hashlib.md5(run_id.encode()).hexdigest()[:16]}"
+
+    _create_marker_table(conn)
+    conn.execute(text(f"""
+        INSERT INTO {SHARD_MARKER_TABLE} VALUES (:run_id, :stage, :shard_index, :shard_count, NOW())
+        ON DUPLICATE KEY UPDATE finished_at = NOW()
+    """), {**markers, "shard_index": shard_index, "shard_count": shard_count})
+    conn.commit()
+
+    if not conn.execute(text("SELECT GET_LOCK(:name, :timeout)"), {"name": lock_name, "timeout": SHARD_LOCK_TIMEOUT}).scalar():
+        raise RuntimeError(f"Could not get lock {lock_name} for {stage}")
+    try:
+        finished, done = conn.execute(text(f"""
+            SELECT COUNT(CASE WHEN shard_index >= 0 THEN 1 END), COUNT(CASE WHEN shard_index = -1 THEN 1 END)
+            FROM {SHARD_MARKER_TABLE}
+            WHERE run_id = :run_id AND stage = :stage
+        """), markers).one()
+        conn.commit()
+
+        if done:
+            logger.info(f"{schema}.{procedure_name}() already ran for {stage} in run {run_id}")
+            return False
+        if finished < shard_count:
+            logger.info(f"Shard {shard_index} of {stage} done ({finished}/{shard_count}), procedure left to the last shard")
+            return False
+
+        logger.info(f"Running Procedure {schema}.{procedure_name}() (last shard of {stage})")
+        with metrics.timer("db_seconds", op="procedure", target=f"{schema}.{procedure_name}"):
+            conn.execute(text(f"CALL {schema}.{procedure_name}()"))
+        conn.execute(text(f"""
+            INSERT INTO {SHARD_MARKER_TABLE} VALUES (:run_id, :stage, -1, :shard_count, NOW())
+        """), {**markers, "shard_count": shard_count})
+        conn.commit()
+        return True
+    finally:
+        conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": lock_name})
+        conn.commit()
+
+
+def finish_shard(schema, procedure_name, stage, run_id=RUN_ID, shard_index=SHARD_INDEX, shard_count=SHARD_COUNT):
+    """
+    Post-merge de una etapa: sin sharding corre el procedure directo; con
+    sharding lo corre una sola vez, en el ultimo shard que termina.
+    """
+    if shard_count <= 1:
+        run_procedure(schema, procedure_name)
+        return True
+
+    try:
+        with get_engine().connect() as conn:
+            return _finish_shard(conn, schema, procedure_name, stage, run_id, shard_index, shard_count)
+    except Exception as e:
+        logger.error(f"Error finishing shard {shard_index} of {stage}: {str(e)}")
+        raise e
+
+
+async def finish_shard_async(schema, procedure_name, stage):
+    """finish_shard sin bloquear el event loop."""
+    async_engine = get_async_engine()
+    if async_engine is None:
+        return await asyncio.to_thread(finish_shard, schema, procedure_name, stage)
+    if SHARD_COUNT <= 1:
+        await run_procedure_async(schema, procedure_name)
+        return True
+
+    try:
+        async with async_engine.connect() as conn:
+            return await conn.run_sync(_finish_shard, schema, procedure_name, stage, RUN_ID, SHARD_INDEX, SHARD_COUNT)
+    except Exception as e:
+        logger.error(f"Error finishing shard {SHARD_INDEX} of {stage}: {str(e)}")
+        raise e
+
+
+def shard_done(stage, run_id=RUN_ID):
+    """True si el procedure de `stage` ya corrio para la corrida (marca shard_index = -1)."""
+    with get_engine().connect() as conn:
+        _create_marker_table(conn)
+        done = conn.execute(text(f"""
+            SELECT 1 FROM {SHARD_MARKER_TABLE}
+            WHERE run_id = :run_id AND stage = :stage AND shard_index = -1
+        """), {"run_id": run_id, "stage": stage}).first()
+        conn.commit()
+    return done is not None
+
+
+async def wait_shard_done(stage, timeout=SHARD_LOCK_TIMEOUT, interval=5):
+    """
+    Con sharding, espera a que el ultimo shard corra el procedure de `stage`
+    (los demas terminan su parte antes). Lanza TimeoutError si no pasa en `timeout` segundos.
+    """
+    if SHARD_COUNT <= 1:
+        return
+    deadline = time.monotonic() + timeout
+    while not await asyncio.to_thread(shard_done, stage):
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"{stage} not finished by all shards of run {RUN_ID} after {timeout}s")
+        await asyncio.sleep(interval)
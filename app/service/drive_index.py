@@ -0,0 +1,143 @@
+import json
+from app.service.credentials import authorized_request
+from app.utils.logger import logger
+from app.utils.local_store import open_store
+from app.settings.config import DRIVE_API_URL, PARENT_FOLDER_ID
+
+FOLDER_MIME = 'application/vnd.google-apps.folder'
+
+
+class DriveFolderIndex:
+    """
+    Indice nombre -> folder_id de las carpetas que ya existen bajo PARENT_FOLDER_ID.
+
+    La primera vez se arma con un files.list paginado; queda cacheado en SQLite
+    junto con el startPageToken de la API de changes, y en las corridas
+    siguientes solo se aplican los cambios desde ese token.
+    """
+
+    def __init__(self, session, credentials, parent_id=PARENT_FOLDER_ID):
+        self.session = session
+        self.credentials = credentials
+        self.parent_id = parent_id or "root"
+        self.folders = {}
+        self._names = {}
+        self._page_token = None
+
+    async def _get(self, path, params):
+        status, _, body = await authorized_request(
+            self.session, self.credentials, "GET", f"{DRIVE_API_URL}{path}", params=params
+        )
+        if status != 200:
+            raise RuntimeError(f"Drive {path} failed: {status} - {body[:200]}")
+        return json.loads(body)
+
+    async def load(self):
+        conn = open_store("drive_index")
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS folder_index (
+                    parent_id TEXT PRIMARY KEY,
+                    page_token TEXT,
+                    folders TEXT NOT NULL
+                )
+            """)
+            row = conn.execute(
+                "SELECT page_token, folders FROM folder_index WHERE parent_id = ?", (self.parent_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+
+        if row and row[0]:
+            self._page_token = row[0]
+            for name, folder_id in json.loads(row[1]).items():
+                self._set(name, folder_id)
+            await self._apply_changes()
+            logger.info(f"Drive folder index refreshed from cache: {len(self.folders)} folders")
+        else:
+            await self._full_scan()
+            logger.info(f"Drive folder index built with full scan: {len(self.folders)} folders")
+        return self
+
+    async def _full_scan(self):
+        # El token se pide antes del scan para no perder cambios que ocurran durante el mismo
+        data = await self._get("/drive/v3/changes/startPageToken", {"supportsAllDrives": "true"})
+        self._page_token = data.get("startPageToken")
+
+        params = {
+            "q": f"'{self.parent_id}' in parents and mimeType = '{FOLDER_MIME}' and trashed = false",
+            "fields": "nextPageToken,files(id,name)",
+            "pageSize": "1000",
+            "supportsAllDrives": "true",
+            "includeItemsFromAllDrives": "true",
+        }
+        while True:
+            data = await self._get("/drive/v3/files", params)
+            for file in data.get("files", []):
+                self._set(file["name"], file["id"])
+            next_page = data.get("nextPageToken")
+            if not next_page:
+                break
+            params["pageToken"] = next_page
+
+    async def _apply_changes(self):
+        params = {
+            "pageToken": self._page_token,
+            "fields": "nextPageToken,newStartPageToken,changes(fileId,removed,file(id,name,parents,trashed,mimeType))",
+            "pageSize": "1000",
+            "includeRemoved": "true",
+            "supportsAllDrives": "true",
+            "includeItemsFromAllDrives": "true",
+        }
+        applied = 0
+        while True:
+            data = await self._get("/drive/v3/changes", params)
+            for change in data.get("changes", []):
+                applied += 1
+                file = change.get("file") or {}
+                inside_parent = (
+                    not change.get("removed")
+                    and not file.get("trashed")
+                    and file.get("mimeType") == FOLDER_MIME
+                    and self.parent_id in file.get("parents", [])
+                )
+                if inside_parent:
+                    self._set(file["name"], file["id"])
+                else:
+                    self._remove(change.get("fileId"))
+
+            if data.get("newStartPageToken"):
+                self._page_token = data["newStartPageToken"]
+                break
+            params["pageToken"] = data["nextPageToken"]
+        logger.info(f"Applied {applied} Drive changes to folder index")
+
+    def _set(self, name, folder_id):
+        previous = self._names.pop(folder_id, None)
+        if previous is not None and self.folders.get(previous) == folder_id:
+            del self.folders[previous]
+        # Si hay duplicados de una corrida anterior se conserva el primero visto
+        self.folders.setdefault(name, folder_id)
+        self._names[folder_id] = name
+
+    def _remove(self, folder_id):
+        name = self._names.pop(folder_id, None)
+        if name is not None and self.folders.get(name) == folder_id:
+            del self.folders[name]
+
+    def get(self, item_id):
+        return self.folders.get(str(item_id))
+
+    def add(self, item_id, folder_id):
+        self._set(str(item_id), folder_id)
+
+    def save(self):
+        conn = open_store("drive_index")
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO folder_index VALUES (?, ?, ?)",
+                    (self.parent_id, self._page_token, json.dumps(self.folders))
+                )
+        finally:
+            conn.close()
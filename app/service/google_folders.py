@@ -1,113 +1,391 @@
 import asyncio
-import aiohttp
+import json
+import re
 import time
-import google.auth
-from google.auth import default
-from google.auth.transport.requests import Request
+import uuid
 from app.utils.logger import logger
-from app.settings.config import SCOPES, PARENT_FOLDER_ID, MAX_CONCURRENT_TASKS
+from app.utils.metrics import metrics
+from app.utils.sharding import shard_filter
+from app.service.http_pool import http_pool
+from app.service.drive_index import DriveFolderIndex
+from app.service.credentials import google_credentials, authorized_request
+from app.service.database import get_items_without_folder_page, load_item_folder_url
+from app.settings.config import (
+    PARENT_FOLDER_ID,
+    MAX_CONCURRENT_TASKS,
+    DRIVE_API_URL,
+    DRIVE_BATCH_SIZE,
+    DRIVE_FOLDER_INDEX,
+    DRIVE_PAGE_SIZE,
+    DRIVE_QUEUE_SIZE,
+    DRIVE_FLUSH_ROWS,
+    DRIVE_FLUSH_SECONDS,
+    DRIVE_MAX_RUNTIME,
+)
 
-# Variable global para trackear el progreso entre corrutinas
-progress_counter = 0
+def folder_payload(item_id):
+    return {
+        'name': str(item_id),
+        'mimeType': 'application/vnd.google-apps.folder',
+        'parents': [PARENT_FOLDER_ID] if PARENT_FOLDER_ID else []
+    }
 
-async def get_access_token():
-    """
-    Obtiene el token de acceso de forma automatica.
-    Funciona via Application Default Credentials (ADC) tanto en local como en GCP.
-    """
-    try:
-        # google.auth.default() devuelve una tupla (credentials, project_id)
-        # Desempaquetamos la tupla para obtener el objeto de credenciales
-        creds, project = google.auth.default(scopes=[SCOPES])
-
-        auth_req = Request()
-        
-        # Ahora sí, llamamos a refresh sobre el objeto 'creds'
-        creds.refresh(auth_req)
-        
-        if not creds.token:
-            raise Exception("No se pudo obtener el token de acceso desde el entorno.")
-            
-        logger.info("Credenciales obtenidas exitosamente mediante ADC.")
-        return creds.token
 
-    except Exception as e:
-        logger.error(f"Error critico al obtener credenciales de Google: {str(e)}")
-        raise
+def folder_result(item_id, folder_id):
+    return {
+        "item_id": item_id,
+        "drive_url": f"https://drive.google.com/drive/folders/{folder_id}"
+    }
+
 
+def track_progress(count, total_items):
+    # El progreso de la corrida vive en metrics (se reinicia al arrancar cada corrida)
+    previous = metrics.value("drive_folders_processed")
+    metrics.inc("drive_folders_processed", count)
+    processed = previous + count
 
-async def create_folder_task(session, item_id, token, semaphore, total_items):
+    # Log de progreso cada 50 items para no saturar la consola
+    if total_items is None:
+        if processed // 50 > previous // 50:
+            logger.info(f"Progreso: {processed} items")
+    elif processed // 50 > previous // 50 or processed == total_items:
+        percentage = (processed / total_items) * 100
+        logger.info(f"Progreso: {processed}/{total_items} ({percentage:.2f}%)")
+
+
+async def create_folder_task(session, item_id, semaphore, total_items):
     """Tarea individual para crear una carpeta en Drive con tracking de progreso"""
-    global progress_counter
     async with semaphore:
-        url = "https://www.googleapis.com/drive/v3/files"
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        
-        payload = {
-            'name': str(item_id),
-            'mimeType': 'application/vnd.google-apps.folder',
-            'parents': [PARENT_FOLDER_ID] if PARENT_FOLDER_ID else []
-        }
+        url = f"{DRIVE_API_URL}/drive/v3/files"
 
         try:
-            async with session.post(url, json=payload, headers=headers) as resp:
-                progress_counter += 1
-                
-                # Log de progreso cada 50 items para no saturar la consola
-                if progress_counter % 50 == 0 or progress_counter == total_items:
-                    percentage = (progress_counter / total_items) * 100
-                    logger.info(f"Progreso: {progress_counter}/{total_items} ({percentage:.2f}%)")
-
-                if resp.status in [200, 201]:
-                    data = await resp.json()
-                    folder_id = data.get('id')
-                    return {
-                        "item_id": item_id, 
-                        "drive_url": f"https://drive.google.com/drive/folders/{folder_id}"
-                    }
-                else:
-                    err_body = await resp.text()
-                    logger.error(f"Error API Drive para {item_id}: {resp.status} - {err_body}")
-                    return None
+            status, _, body = await authorized_request(
+                session, google_credentials, "POST", url, json=folder_payload(item_id)
+            )
+            track_progress(1, total_items)
+
+            if status in [200, 201]:
+                return folder_result(item_id, json.loads(body).get('id'))
+            else:
+                logger.error(f"Error API Drive para {item_id}: {status} - {body}")
+                return None
         except Exception as e:
             logger.error(f"Error de red crítico para {item_id}: {e}")
             return None
 
-async def run_drive_automation(items_input):
+
+# ==========================================================
+# BATCH API (multipart/mixed, hasta 100 requests por llamada)
+# ==========================================================
+
+def build_batch_body(item_ids, boundary):
+    """Arma el cuerpo multipart/mixed con un POST /drive/v3/files por item."""
+    parts = []
+    for item_id in item_ids:
+        parts.append(
+            f"--{boundary}\r\n"
+            "Content-Type: application/http\r\n"
+            f"Content-ID: <item-{item_id}>\r\n"
+            "\r\n"
+            "POST /drive/v3/files HTTP/1.1\r\n"
+            "Content-Type: application/json; charset=UTF-8\r\n"
+            "\r\n"
+            f"{json.dumps(folder_payload(item_id))}\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n")
+    return "".join(parts)
+
+
+def parse_batch_response(body, content_type):
+    """
+    Parsea la respuesta multipart/mixed del batch.
+    Devuelve {content_id: (status, data)}, con content_id sin el prefijo 'response-'.
+    """
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not match:
+        raise ValueError(f"Batch response without boundary: {content_type}")
+    boundary = match.group(1)
+
+    responses = {}
+    for part in body.split(f"--{boundary}"):
+        part = part.strip()
+        if not part or part == "--":
+            continue
+
+        # Headers del part / respuesta HTTP embebida
+        sections = re.split(r"\r?\n\r?\n", part, maxsplit=2)
+        if len(sections) < 2:
+            continue
+        part_headers = sections[0]
+        http_head = sections[1]
+        http_body = sections[2] if len(sections) > 2 else ""
+
+        content_id = re.search(r"Content-ID:\s*<(?:response-)?([^>]+)>", part_headers, re.IGNORECASE)
+        status = re.match(r"HTTP/\S+\s+(\d{3})", http_head)
+        if not content_id or not status:
+            continue
+
+        try:
+            data = json.loads(http_body) if http_body.strip() else {}
+        except ValueError:
+            data = {"raw": http_body}
+        responses[content_id.group(1)] = (int(status.group(1)), data)
+
+    return responses
+
+
+async def create_folders_batch(session, items, semaphore, total_items):
+    """
+    Crea las carpetas de `items` en un solo request batch.
+    Devuelve (resultados, item_ids fallidos) para reintentar individualmente.
+    """
+    by_content_id = {f"item-{item_id}": item_id for item_id in items}
+    boundary = f"batch_{uuid.uuid4().hex}"
+
+    async with semaphore:
+        try:
+            status, headers, body = await authorized_request(
+                session,
+                google_credentials,
+                "POST",
+                f"{DRIVE_API_URL}/batch/drive/v3",
+                data=build_batch_body(items, boundary).encode("utf-8"),
+                headers={"Content-Type": f"multipart/mixed; boundary={boundary}"},
+            )
+            if status != 200:
+                logger.error(f"Error API Drive batch: {status} - {body[:200]}")
+                return [], list(items)
+            responses = parse_batch_response(body, headers.get("Content-Type", ""))
+        except Exception as e:
+            logger.error(f"Error de red crítico en batch de {len(items)} items: {e}")
+            return [], list(items)
+
+    results = []
+    failed = []
+    for content_id, item_id in by_content_id.items():
+        status, data = responses.get(content_id, (None, None))
+        if status in (200, 201) and data.get("id"):
+            results.append(folder_result(item_id, data["id"]))
+        else:
+            failed.append(item_id)
+
+    track_progress(len(results), total_items)
+    return results, failed
+
+
+async def load_folder_index(session):
+    """Indice de carpetas existentes, o None si esta deshabilitado o falla."""
+    if DRIVE_FOLDER_INDEX != 1:
+        return None
+    try:
+        return await DriveFolderIndex(session, google_credentials).load()
+    except Exception as e:
+        logger.error(f"No se pudo armar el indice de carpetas de Drive: {e}")
+        return None
+
+
+async def create_folders(session, item_ids, semaphore, total_items, batch_size, index=None):
+    """
+    Crea (o reutiliza via `index`) las carpetas de `item_ids`.
+    Devuelve solo los resultados exitosos [{"item_id", "drive_url"}].
+    """
+    reused = []
+    if index is not None:
+        reused = [folder_result(i, index.get(i)) for i in item_ids if index.get(i)]
+        item_ids = [i for i in item_ids if not index.get(i)]
+        track_progress(len(reused), total_items)
+
+    if batch_size > 0:
+        batches = await asyncio.gather(*[
+            create_folders_batch(session, item_ids[i:i + batch_size], semaphore, total_items)
+            for i in range(0, len(item_ids), batch_size)
+        ])
+        results = [r for batch_results, _ in batches for r in batch_results]
+        failed = [item_id for _, batch_failed in batches for item_id in batch_failed]
+        if failed:
+            logger.info(f"Reintentando individualmente {len(failed)} items fallidos en batch.")
+            results += await asyncio.gather(*[
+                create_folder_task(session, item_id, semaphore, total_items)
+                for item_id in failed
+            ])
+    else:
+        tasks = [
+            create_folder_task(session, item_id, semaphore, total_items)
+            for item_id in item_ids
+        ]
+
+        # gather ejecuta todo y mantiene el orden
+        results = await asyncio.gather(*tasks)
+
+    results = [r for r in results if r is not None]
+    if index is not None:
+        for r in results:
+            index.add(r["item_id"], r["drive_url"].rsplit("/", 1)[-1])
+    return reused + results
+
+
+async def run_drive_automation(items_input, batch_size=None):
     """
     Función principal con métricas de tiempo y progreso.
+    Con batch_size > 0 (default DRIVE_BATCH_SIZE) usa la batch API de Drive
+    y reintenta de a uno los items que fallaron dentro del batch.
     """
-    global progress_counter
-    progress_counter = 0 # Reiniciar contador
+    metrics.set("drive_folders_processed", 0) # Reiniciar contador
     total_items = len(items_input)
-    
+
     logger.info(f"🚀 Iniciando automatización de Drive para {total_items} ítems.")
     start_time = time.time()
 
-    token = await get_access_token()
     semaphore = asyncio.Semaphore(MAX_CONCURRENT_TASKS)
-    
-    async with aiohttp.ClientSession() as session:
-        tasks = [
-            create_folder_task(session, item['id'], token, semaphore, total_items) 
-            for item in items_input
-        ]
-        
-        # gather ejecuta todo y mantiene el orden
-        results = await asyncio.gather(*tasks)
-    
+
+    batch_size = DRIVE_BATCH_SIZE if batch_size is None else min(batch_size, 100)
+    session = http_pool.session(DRIVE_API_URL)
+
+    # Carpetas que ya existen (p. ej. de una corrida que fallo antes de guardar en DB)
+    index = await load_folder_index(session)
+    clean_results = await create_folders(
+        session, [item['id'] for item in items_input], semaphore, total_items, batch_size, index
+    )
+    if index is not None:
+        index.save()
+
     end_time = time.time()
     duration = end_time - start_time
-    
-    clean_results = [r for r in results if r is not None]
-    
+
+    metrics.inc("stage_items_total", len(clean_results), stage="drive_folders")
     logger.info("--- Resumen de Ejecución ---")
     logger.info(f"Finalizado en: {duration:.2f} segundos")
     logger.info(f"Exitosos: {len(clean_results)}")
     logger.info(f"Fallidos: {total_items - len(clean_results)}")
     logger.info("----------------------------")
-    
-    return clean_results
\ No newline at end of file
+
+    return clean_results
+
+
+# ==========================================================
+# PIPELINE STREAMING (lectura paginada -> creacion -> flush en micro-batches)
+# ==========================================================
+
+async def run_drive_pipeline(max_runtime=None, batch_size=None):
+    """
+    Lee de product_catalog_sync los items sin drive_url por paginas (keyset),
+    los pasa por una cola acotada a los workers que crean las carpetas y
+    persiste las URLs cada DRIVE_FLUSH_ROWS resultados o DRIVE_FLUSH_SECONDS.
+    Con max_runtime > 0 deja de leer nuevas paginas al vencer el tiempo,
+    termina lo encolado y hace el ultimo flush; el resto queda para la proxima corrida.
+    """
+    metrics.set("drive_folders_processed", 0)
+
+    max_runtime = DRIVE_MAX_RUNTIME if max_runtime is None else max_runtime
+    deadline = time.monotonic() + max_runtime if max_runtime > 0 else None
+    batch_size = DRIVE_BATCH_SIZE if batch_size is None else min(batch_size, 100)
+    group_size = batch_size or 1
+    workers_count = MAX_CONCURRENT_TASKS
+
+    logger.info("🚀 Iniciando pipeline de carpetas de Drive.")
+    start_time = time.time()
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_TASKS)
+    session = http_pool.session(DRIVE_API_URL)
+    index = await load_folder_index(session)
+
+    work_queue = asyncio.Queue(maxsize=DRIVE_QUEUE_SIZE)
+    result_queue = asyncio.Queue()
+    stats = {"read": 0, "created": 0, "written": 0}
+
+    async def producer():
+        last_id = 0
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                page = await asyncio.to_thread(get_items_without_folder_page, last_id, DRIVE_PAGE_SIZE)
+                if not page:
+                    break
+                last_id = page[-1]
+                # El keyset avanza con la pagina completa; cada shard encola solo sus items
+                page = shard_filter(page)
+                stats["read"] += len(page)
+                for item_id in page:
+                    await work_queue.put(item_id)
+            else:
+                logger.info(f"Tiempo maximo de {max_runtime:.0f}s alcanzado, no se leen mas items.")
+        finally:
+            for _ in range(workers_count):
+                await work_queue.put(None)
+
+    async def worker():
+        finished = False
+        while not finished:
+            item_id = await work_queue.get()
+            if item_id is None:
+                return
+            group = [item_id]
+            while len(group) < group_size and not work_queue.empty():
+                next_id = work_queue.get_nowait()
+                if next_id is None:
+                    finished = True
+                    break
+                group.append(next_id)
+
+            for r in await create_folders(session, group, semaphore, None, batch_size, index):
+                stats["created"] += 1
+                await result_queue.put(r)
+
+    async def writer():
+        buffer = []
+        last_flush = time.monotonic()
+
+        async def flush():
+            nonlocal buffer, last_flush
+            if buffer:
+                await asyncio.to_thread(load_item_folder_url, buffer)
+                stats["written"] += len(buffer)
+                logger.info(f"Flush de {len(buffer)} drive_url ({stats['written']} en total)")
+            buffer = []
+            last_flush = time.monotonic()
+
+        while True:
+            timeout = max(0.0, DRIVE_FLUSH_SECONDS - (time.monotonic() - last_flush))
+            try:
+                r = await asyncio.wait_for(result_queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                await flush()
+                continue
+            if r is None:
+                await flush()
+                return
+            buffer.append(r)
+            if len(buffer) >= DRIVE_FLUSH_ROWS:
+                await flush()
+
+    async def creators():
+        # Se espera a todos los workers aunque falle la lectura, asi lo ya creado llega al writer
+        try:
+            outcomes = await asyncio.gather(
+                producer(), *[worker() for _ in range(workers_count)], return_exceptions=True
+            )
+        finally:
+            await result_queue.put(None)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+
+    tasks = [asyncio.ensure_future(creators()), asyncio.ensure_future(writer())]
+    try:
+        await asyncio.gather(*tasks)
+    except Exception:
+        for task in tasks:
+            task.cancel()
+        raise
+    finally:
+        if index is not None:
+            index.save()
+
+    duration = time.time() - start_time
+    metrics.inc("stage_items_total", stats["written"], stage="drive_folders")
+    logger.info("--- Resumen de Ejecución ---")
+    logger.info(f"Finalizado en: {duration:.2f} segundos")
+    logger.info(f"Leidos: {stats['read']}")
+    logger.info(f"Exitosos: {stats['created']}")
+    logger.info(f"Guardados en DB: {stats['written']}")
+    logger.info("----------------------------")
+    return stats
@@ -0,0 +1,50 @@
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from app.utils.logger import logger
+from app.settings.config import (
+    HTTP_POOL_LIMIT,
+    HTTP_LIMIT_PER_HOST,
+    HTTP_KEEPALIVE,
+    HTTP_DNS_TTL,
+    HTTP_TIMEOUT,
+)
+
+
+class HttpPool:
+    """
+    Sesiones aiohttp compartidas por todo el job, una por host.
+    Cada host mantiene su propio pool de conexiones keep-alive y cache de DNS,
+    asi las etapas reutilizan conexiones TLS en lugar de abrir nuevas.
+    Debe usarse dentro del mismo event loop y cerrarse al final con `close()`.
+    """
+
+    def __init__(self):
+        self._sessions = {}
+
+    def session(self, url, limit_per_host=None):
+        host = urlsplit(url).netloc or url
+        session = self._sessions.get(host)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_LIMIT,
+                limit_per_host=limit_per_host or HTTP_LIMIT_PER_HOST,
+                ttl_dns_cache=HTTP_DNS_TTL,
+                keepalive_timeout=HTTP_KEEPALIVE,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+            )
+            self._sessions[host] = session
+            logger.info(f"Opened HTTP pool for {host}")
+        return session
+
+    async def close(self):
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
+
+
+http_pool = HttpPool()
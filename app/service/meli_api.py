@@ -1,12 +1,37 @@
 import asyncio
-import aiohttp
-import json
-import requests
+import time
 from datetime import datetime
 from app.utils.logger import logger
-from app.service.secrets import meli_secrets
-from app.service.database import get_method, update_method, run_procedure
-from app.settings.config import SCHEMA_INVENTORY, PRODUCTS_TABLE
+from app.service.database import get_method_async, update_method_async, finish_shard_async
+from app.service.product_snapshot import load_snapshot, invalidate_snapshot
+from app.service.accounts import load_accounts, item_owners, MULTI_ACCOUNT, SELLER_COLUMN
+from app.service.checkpoint import RunJournal
+from app.service.catalog_cache import CatalogCache
+from app.service.sync_state import StatusSyncState
+from app.service.row_hashes import RowHashIndex
+from app.utils.row_batch import RowBatch
+from app.utils import jsonutil
+from app.utils.metrics import metrics
+from app.utils.sharding import keyed_chunks, shard_filter
+from app.settings.config import (
+    MELI_CHUNK_CONCURRENCY,
+    MELI_ITEM_CONCURRENCY,
+    STATUS_SYNC_INCREMENTAL,
+    STATUS_FULL_REFRESH_EVERY,
+    MELI_ITEM_ATTRIBUTES,
+)
+
+MULTIGET_SIZE = 20
+
+STATUS_COLUMNS = (
+    ("meli_id", "char(255)"),
+    ("status", "char(255)"),
+    ("reason", "char(255)"),
+    ("remedy", "char(255)"),
+    ("updated_at", "datetime"),
+    ("variants", "json"),
+    ("listing_catalog", "json"),
+)
 
 
 def variation_metadata(variation):
@@ -25,164 +50,322 @@ def variation_metadata(variation):
     return meta
 
 
-def product_status_sync():
+class SyncContext:
+    """Estado compartido por todas las tareas de una corrida del status sync."""
+
+    def __init__(self, client, seller_id, current_time, previous=None, catalog_cache=None, moderation_retry=()):
+        self.client = client
+        self.seller_id = seller_id
+        self.current_time = current_time
+        # Dos pools acotados: multigets por un lado, catalogo/moderacion por otro
+        self.chunk_semaphore = asyncio.Semaphore(MELI_CHUNK_CONCURRENCY)
+        self.item_semaphore = asyncio.Semaphore(MELI_ITEM_CONCURRENCY)
+        self.catalog_cache = catalog_cache or CatalogCache()
+        # Snapshot previo de product_status (None = corrida completa)
+        self.previous = previous
+        # Items cuya moderacion fallo en la corrida anterior: no se arrastra su reason/remedy
+        self.moderation_retry = set(moderation_retry)
+        self.moderation_failed = set()
+        self.last_updated = {}
+        self.moderation_calls = 0
+        self.moderation_skipped = 0
+
+
+async def fetch_catalog_list(ctx, catalog_product_id):
+    """Items de otros vendedores compitiendo en el mismo producto de catalogo."""
+
+    async def fetch():
+        async with ctx.item_semaphore:
+            catalog_data, _ = await ctx.client.get_json(
+                f"/products/{catalog_product_id}/items"
+            )
+        return catalog_data
+
+    catalog_items = await ctx.catalog_cache.get(catalog_product_id, fetch)
+    if not catalog_items:
+        return None
+
+    catalog_list = [{'id': catalog.get('item_id')} for catalog in catalog_items if catalog.get('seller_id') == ctx.seller_id]
+    return jsonutil.dumps(catalog_list)
+
+
+async def fetch_moderation(ctx, item_id):
     """
-    Retorna el estado completo de los items publicados:
-    meli_id, stock, status, reason, remedy y updated_at.
+    Devuelve (reason, remedy) de la ultima moderacion del item. Si la consulta
+    falla (ni 200 ni 404) el item queda en ctx.moderation_failed.
     """
-    logger.info("Starting Product Status Sync Process..")
-    token = meli_secrets()
-    headers = {"Authorization": f"Bearer {token}"}
+    reason = None
+    remedy = None
+
+    ctx.moderation_calls += 1
+    async with ctx.item_semaphore:
+        response_mod, status_code = await ctx.client.get_json(
+            f"/moderations/last_moderation/{item_id}-ITM"
+        )
+
+    if status_code not in (200, 404):
+        ctx.moderation_failed.add(item_id)
+        metrics.inc("moderation_failed_total")
+
+    if status_code == 200 and response_mod:
+
+        if isinstance(response_mod, list):
+            wordings = response_mod[0].get("wordings", [])
+        else:
+            wordings = []
+
+        if len(wordings) > 0:
+            reason = wordings[0].get(
+                "value",
+                "No reason provided"
+            )
+
+        if len(wordings) > 1:
+            remedy = wordings[1].get(
+                "value",
+                "No remedy provided"
+            )
+
+    return reason, remedy
+
 
+def build_variants_data(variations):
+    if not variations:
+        return None
 
-    res = requests.get("https://api.mercadolibre.com//users/me",headers=headers)
-    data = res.json()
-    seller_id = data.get("id")
+    total_stock = sum(v.get("available_quantity", 0) for v in variations)
+    variants_data = {
+            "product_stock": total_stock,
+            "variations": []}
 
-    async def fetch_json(session, url, params=None):
-        async with session.get(url, params=params) as resp:
-            if resp.status == 200:
-                return await resp.json(), resp.status
-            return None, resp.status
+    for variation in variations:
+        variants_data["variations"].append({
+            "id": variation["id"],
+            "available_quantity": variation.get("available_quantity"),
+            "price": variation.get("price"),
+            "attribute_combinations": variation.get("attribute_combinations", [])
+        })
 
-    async def main():
+    return jsonutil.dumps(variants_data)
+
+
+def item_changed(previous, status, variants_data, last_updated):
+    """Compara el item contra el snapshot previo de product_status."""
+    if status != previous["status"]:
+        return True
+
+    known_last_updated = previous.get("last_updated")
+    if known_last_updated is not None and last_updated != known_last_updated:
+        return True
+
+    stored_variants = previous["variants"]
+    if isinstance(stored_variants, str):
+        stored_variants = jsonutil.loads(stored_variants)
+    new_variants = jsonutil.loads(variants_data) if variants_data else None
+    return stored_variants != new_variants
+
+
+def summarize_items(items_data):
+    """
+    Reduce la respuesta del multiget a lo que usa el sync:
+    (item_id, status, catalog_product_id, variants_data, last_updated) por item.
+    Corre junto con el parseo del JSON (en un thread si la respuesta es grande).
+    """
+    summaries = []
+    for item_info in items_data or []:
+        body = item_info.get("body") or {}
+        summaries.append((
+            body.get("id"),
+            body.get("status"),
+            body.get("catalog_product_id"),
+            build_variants_data(body.get("variations", [])),
+            body.get("last_updated"),
+        ))
+    return summaries
+
+
+async def process_item(ctx, summary):
+    """Arma la fila de product_status (tupla en orden STATUS_COLUMNS) para un item del multiget."""
+    item_id, status, catalog_product_id, variants_data, last_updated = summary
+
+    if item_id and last_updated:
+        ctx.last_updated[item_id] = last_updated
+
+    catalog_list = None
+    reason = None
+    remedy = None
+
+    # Catalogo y moderacion son independientes, se piden en paralelo
+    pending = {}
+
+    if catalog_product_id:
+        pending["catalog"] = fetch_catalog_list(ctx, catalog_product_id)
+
+    # ==================================================
+    # 4. MODERATION
+    # ==================================================
+
+    if status != "active" and item_id:
+        previous = ctx.previous.get(item_id) if ctx.previous is not None else None
+        if (previous is not None and item_id not in ctx.moderation_retry
+                and not item_changed(previous, status, variants_data, last_updated)):
+            # Mismo estado que la corrida anterior: se arrastra reason/remedy
+            ctx.moderation_skipped += 1
+            reason = previous["reason"]
+            remedy = previous["remedy"]
+        else:
+            pending["moderation"] = fetch_moderation(ctx, item_id)
+
+    if pending:
+        done = dict(zip(pending, await asyncio.gather(*pending.values())))
+        catalog_list = done.get("catalog")
+        reason, remedy = done.get("moderation", (reason, remedy))
+
+    # Mismo orden que STATUS_COLUMNS
+    return (item_id, status, reason, remedy, ctx.current_time, variants_data, catalog_list)
+
+
+async def process_chunk(ctx, chunk):
+    """Multiget de hasta 20 ids y procesamiento concurrente de cada item."""
+    async with ctx.chunk_semaphore:
+        logger.info(f"Processing Chunk: {chunk}")
+        params = {"ids": ",".join(chunk)}
+        if MELI_ITEM_ATTRIBUTES:
+            # Solo los campos que se usan: el body completo trae fotos, descripciones y atributos
+            params["attributes"] = MELI_ITEM_ATTRIBUTES
+        summaries, status_code = await ctx.client.get_json("/items", params=params, transform=summarize_items)
+
+    if not summaries:
+        logger.warning(f"Multiget failed ({status_code}) for chunk starting at {chunk[0]}")
+        return []
+
+    tasks = [process_item(ctx, summary) for summary in summaries]
+    # gather mantiene el orden del multiget
+    return await asyncio.gather(*tasks)
+
+
+async def load_status_snapshot(sync_state):
+    """Ultimo estado guardado en product_status, indexado por meli_id."""
+    query = {
+        'q_columns': [
+            'meli_id',
+            'status',
+            'reason',
+            'remedy',
+            'variants',
+        ],
+        'q_from': 'FROM mercadolibre.product_status',
+    }
+
+    previous = {row['meli_id']: row for row in await get_method_async(query)}
+    for meli_id, row in previous.items():
+        row['last_updated'] = sync_state.last_updated.get(meli_id)
+
+    logger.info(f"Loaded previous status snapshot: {len(previous)} items")
+    return previous
+
+
+async def product_status_sync():
+    """
+    Retorna el estado completo de los items publicados:
+    meli_id, stock, status, reason, remedy y updated_at.
+    """
+    logger.info("Starting Product Status Sync Process..")
+    accounts = await load_accounts()
+    tag_seller = MULTI_ACCOUNT
+    columns = STATUS_COLUMNS + ((SELLER_COLUMN,) if tag_seller else ())
+
+    journal = RunJournal("status_sync")
+    try:
+        sync_state = None
+        previous = None
+        if STATUS_SYNC_INCREMENTAL == 1:
+            sync_state = StatusSyncState()
+            if not sync_state.is_full_refresh(STATUS_FULL_REFRESH_EVERY):
+                previous = await load_status_snapshot(sync_state)
+
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        owner_of = await item_owners(accounts)
+        # Un contexto por cuenta (seller_id y limites propios), el cache de catalogo es comun
+        catalog_cache = CatalogCache()
+        contexts = {
+            account: SyncContext(
+                account.client, account.seller_id, current_time, previous, catalog_cache,
+                moderation_retry=sync_state.moderation_failed if previous is not None else (),
+            )
+            for account in accounts
+        }
+
+        # ==========================================================
+        # 3. MULTIGET ITEMS
+        # ==========================================================
+
+        async def run_chunk(account, chunk):
+            ctx = contexts[account]
+            rows = await process_chunk(ctx, chunk)
+            if tag_seller:
+                rows = [row + (account.seller_id,) for row in rows]
+            account.track("status_sync", len(rows))
+            # Un multiget fallido (o con moderaciones fallidas) no se registra, asi se vuelve a pedir al retomar
+            if rows and ctx.moderation_failed.isdisjoint(chunk):
+                journal.record(chunk, rows, {i: ctx.last_updated[i] for i in chunk if i in ctx.last_updated})
+            return rows
+
+        snapshot = await load_snapshot()
+        item_ids = shard_filter(snapshot.published())
+        logger.info(f"Products Published in Mercadolibre: {len(item_ids)}")
+
+        start_time = time.perf_counter()
+        chunk_results = await asyncio.gather(*[
+            run_chunk(account, chunk)
+            for account, chunk in keyed_chunks(item_ids, MULTIGET_SIZE, owner_of, skip=journal.done_ids)
+        ])
+        final_results = RowBatch(columns)
+        final_results.extend(journal.rows)
+        for rows in chunk_results:
+            final_results.extend(rows)
+        del chunk_results
+        catalog_cache.close()
+        for account in accounts:
+            account.report("status_sync", start_time)
+
+        duration = time.perf_counter() - start_time
+        rate = len(final_results) / duration if duration > 0 else 0
+        logger.info(f"Fetched {len(final_results)} items in {duration:.2f}s ({rate:.1f} items/s)")
+        logger.info(
+            f"Moderation calls: {sum(ctx.moderation_calls for ctx in contexts.values())}, "
+            f"carried forward: {sum(ctx.moderation_skipped for ctx in contexts.values())}, "
+            f"failed: {sum(len(ctx.moderation_failed) for ctx in contexts.values())}"
+        )
+
+        # updated_at cambia en cada corrida, no cuenta como cambio de contenido
+        hashes = RowHashIndex("mercadolibre.product_status", volatile=("updated_at",))
         try:
-            timeout = aiohttp.ClientTimeout(total=60)
-            connector = aiohttp.TCPConnector(limit_per_host=10)
-            semaphore = asyncio.Semaphore(20)
-
-            final_results = []
-
-            async with aiohttp.ClientSession(
-                headers=headers,
-                timeout=timeout,
-                connector=connector
-            ) as session:
-
-
-                query = {
-                    'q_columns': [
-                        'a.meli_id',
-                    ],
-                    'q_from':f'FROM {SCHEMA_INVENTORY}.{PRODUCTS_TABLE} as a',    
-                    'q_where': f'WHERE a.meli_id is not null',
-                }
-
-                item_ids = [i.get('meli_id') for i in get_method(query)]
-                logger.info(f"Products Published in Mercadolibre: {len(item_ids)}")
-                current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-                # ==========================================================
-                # 3. MULTIGET ITEMS
-                # ==========================================================
-
-                for i in range(0, len(item_ids), 20):
-
-                    chunk = item_ids[i:i + 20]
-                    logger.info(f"Processing Chunk: {chunk}")
-
-                    async with semaphore:
-                        items_data, _ = await fetch_json(
-                            session,
-                            "https://api.mercadolibre.com/items",
-                            params={
-                                "ids": ",".join(chunk)
-                            }
-                        )
-
-                    if not items_data:
-                        continue
-
-                    for item_info in items_data:
-
-                        body = item_info.get("body", {})
-                        item_id = body.get("id")
-                        status = body.get("status")
-                        reason = None
-                        remedy = None
-                        variations = body.get("variations", [])
-                        variants_data= None
-                        catalog_product_id = body.get("catalog_product_id")
-                        catalog_list = None
-                        catalog_items = []
-
-                        if catalog_product_id:
-                            async with semaphore:
-                                catalog_data, _ = await fetch_json(
-                                    session,
-                                    f"https://api.mercadolibre.com/products/{catalog_product_id}/items"
-                                )
-                            if catalog_data:
-                                catalog_items = catalog_data.get("results", [])
-
-                        if catalog_items:
-                            catalog_list = [{'id': catalog.get('item_id')} for catalog in catalog_items if catalog.get('seller_id') == seller_id]
-                            catalog_list = json.dumps(catalog_list) 
-
-                        if variations:
-                            total_stock = sum(v.get("available_quantity", 0) for v in variations)
-                            variants_data ={
-                                    "product_stock": total_stock,
-                                    "variations": []}
-                            
-                            for variation in variations:
-                                variants_data["variations"].append({
-                                    "id": variation["id"],
-                                    "available_quantity": variation.get("available_quantity"),
-                                    "price": variation.get("price"),
-                                    "attribute_combinations": variation.get("attribute_combinations", [])
-                                })
-
-                            variants_data = json.dumps(variants_data)
-
-                        # ==================================================
-                        # 4. MODERATION
-                        # ==================================================
-
-                        if status != "active" and item_id:
-
-                            async with semaphore:
-                                response_mod, status_code = await fetch_json(
-                                    session,
-                                    f"https://api.mercadolibre.com/moderations/last_moderation/{item_id}-ITM"
-                                )
-
-                            if status_code == 200 and response_mod:
-
-                                if isinstance(response_mod, list):
-                                    wordings = response_mod[0].get("wordings", [])
-                                else:
-                                    wordings = []
-
-                                if len(wordings) > 0:
-                                    reason = wordings[0].get(
-                                        "value",
-                                        "No reason provided"
-                                    )
-
-                                if len(wordings) > 1:
-                                    remedy = wordings[1].get(
-                                        "value",
-                                        "No remedy provided"
-                                    )
-
-                        final_results.append({
-                            "meli_id": {"value":item_id, "type":"char(255)"},
-                            "status": {"value":status, "type":"char(255)"},
-                            "reason": {"value":reason, "type":"char(255)"},
-                            "remedy": {"value":remedy, "type":"char(255)"},
-                            "updated_at": {"value":current_time, "type":"datetime"},
-                            "variants": {"value":variants_data, "type":"json"},
-                            "listing_catalog": {"value":catalog_list, "type":"json"},
-                        })
-
-                update_method(final_results, "mercadolibre", "product_status")
-                run_procedure("app_import", "update_meli_status")
-                logger.info("Process Completed.")
-                return
-            
-        except Exception as e:
-            logger.error(f"Error crítico en proceso de auditoría: {e}")
-            return []
-
-    return asyncio.run(main())
\ No newline at end of file
+            await update_method_async(hashes.changed(final_results), "mercadolibre", "product_status")
+            await finish_shard_async("app_import", "update_meli_status", stage="status_sync")
+            # Los meli_id recien vinculados por el procedure tienen que verse en prepublish
+            invalidate_snapshot()
+            hashes.commit()
+        finally:
+            hashes.close()
+        journal.clear()
+        metrics.inc("stage_items_total", len(final_results), stage="status_sync")
+
+        if sync_state is not None:
+            last_updated = dict(journal.meta)
+            moderation_failed = set()
+            for ctx in contexts.values():
+                last_updated.update(ctx.last_updated)
+                moderation_failed |= ctx.moderation_failed
+            sync_state.save(last_updated, moderation_failed)
+
+        logger.info("Process Completed.")
+        return
+
+    except Exception as e:
+        # Se propaga para que la etapa quede fallida: el job sale con error, Cloud Run
+        # reintenta la tarea y el journal retoma los chunks ya obtenidos
+        logger.error(f"Error crítico en proceso de auditoría: {e}")
+        raise
+    finally:
+        journal.close()
@@ -0,0 +1,208 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+
+from app.utils.logger import logger
+from app.utils import jsonutil
+from app.utils.metrics import metrics
+from app.utils.rate_limit import TokenBucket, AIMDLimiter
+from app.service.http_pool import http_pool
+from app.settings.config import (
+    MELI_API_URL,
+    MELI_LIMIT_PER_HOST,
+    MELI_RATE_LIMIT,
+    MELI_ENDPOINT_LIMITS,
+    MELI_MAX_RETRIES,
+    MELI_RETRY_BUDGET,
+    MELI_PARSE_THREAD_BYTES,
+)
+
+# endpoint -> (requests por segundo, concurrencia maxima)
+DEFAULT_ENDPOINT_LIMITS = {
+    "items": (20, 10),
+    "products": (30, 20),
+    "moderations": (20, 10),
+    "performance": (30, 20),
+    "questions": (10, 5),
+    "search": (10, 4),
+    "users": (5, 2),
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_endpoint_limits(raw):
+    limits = dict(DEFAULT_ENDPOINT_LIMITS)
+    for entry in filter(None, (e.strip() for e in raw.split(","))):
+        name, values = entry.split("=")
+        rate, concurrency = values.split(":")
+        limits[name.strip()] = (float(rate), int(concurrency))
+    return limits
+
+
+def endpoint_for(path):
+    """Clasifica el path de la API en uno de los endpoints con limite propio."""
+    if path.startswith("/items"):
+        return "items"
+    if path.startswith("/products/"):
+        return "products"
+    if path.startswith("/moderations/"):
+        return "moderations"
+    if path.startswith("/item/") and path.endswith("/performance"):
+        return "performance"
+    if path.startswith("/questions/"):
+        return "questions"
+    if path.startswith("/users/") and path.endswith("/items/search"):
+        return "search"
+    return "users"
+
+
+def decode(body, transform=None):
+    data = jsonutil.loads(body)
+    return transform(data) if transform is not None else data
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class MeliClient:
+    """
+    Capa comun para todos los requests a la API de Mercado Libre.
+
+    - Token bucket global (MELI_RATE_LIMIT) y uno por endpoint.
+    - Concurrencia AIMD por endpoint: baja a la mitad ante 429/5xx y respeta Retry-After.
+    - Reintentos con backoff exponencial + jitter, acotados por request y por
+      un presupuesto total de reintentos para la corrida.
+    - Ante un 401 renueva el token una vez y repite el request.
+    - El JSON se parsea con jsonutil (orjson si esta instalado); las respuestas
+      de mas de parse_thread_bytes se parsean en un thread.
+    """
+
+    def __init__(self, session, credentials, base_url=MELI_API_URL, endpoint_limits=None,
+                 max_retries=MELI_MAX_RETRIES, retry_budget=MELI_RETRY_BUDGET,
+                 parse_thread_bytes=MELI_PARSE_THREAD_BYTES):
+        self.session = session
+        self.credentials = credentials
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget
+        self.parse_thread_bytes = parse_thread_bytes
+        self.retries = 0
+        self.throttled = 0
+
+        limits = endpoint_limits or parse_endpoint_limits(MELI_ENDPOINT_LIMITS)
+        self._global_bucket = TokenBucket(MELI_RATE_LIMIT)
+        self._buckets = {name: TokenBucket(rate) for name, (rate, _) in limits.items()}
+        self._limiters = {
+            name: AIMDLimiter(concurrency, maximum=concurrency)
+            for name, (_, concurrency) in limits.items()
+        }
+
+    async def get_json(self, path, params=None, transform=None):
+        """
+        GET a la API. Devuelve (data, status); data es None si la respuesta no fue 200.
+        `transform` se aplica a la respuesta parseada, en el mismo thread que el parseo.
+        """
+        endpoint = endpoint_for(path)
+        bucket = self._buckets[endpoint]
+        limiter = self._limiters[endpoint]
+        url = f"{self.base_url}{path}"
+        token = await self.credentials.get()
+        token_refreshed = False
+
+        attempt = 0
+        while True:
+            queued = time.perf_counter()
+            await limiter.acquire()
+            try:
+                await self._global_bucket.acquire()
+                await bucket.acquire()
+                headers = {"Authorization": f"Bearer {token}"}
+                started = time.perf_counter()
+                # Tiempo esperando cupo (AIMD + token buckets): separa throttling de latencia de Meli
+                metrics.observe("http_wait_seconds", started - queued, service="meli", endpoint=endpoint)
+                status, body, retry_after = await self._request(url, params, headers)
+            finally:
+                await limiter.release()
+
+            latency = time.perf_counter() - started
+            metrics.observe("http_request_seconds", latency, service="meli", endpoint=endpoint)
+            metrics.inc("http_requests_total", service="meli", endpoint=endpoint, status=status)
+
+            if status == 200:
+                limiter.on_success()
+                metrics.inc("http_response_bytes_total", len(body), service="meli", endpoint=endpoint)
+                return await self._decode(body, transform, endpoint), status
+
+            if status == 401 and not token_refreshed:
+                token_refreshed = True
+                token = await self.credentials.refresh(token)
+                continue
+
+            if status not in RETRY_STATUSES:
+                return None, status
+
+            self.throttled += 1
+            limiter.on_throttle(retry_after, latency)
+
+            if attempt >= self.max_retries or self.retries >= self.retry_budget:
+                logger.error(f"Giving up on {path} after {attempt + 1} attempts (status {status})")
+                return None, status
+
+            attempt += 1
+            self.retries += 1
+            metrics.inc("http_retries_total", service="meli", endpoint=endpoint)
+            backoff = retry_after if retry_after is not None else random.uniform(0, min(30, 0.5 * 2 ** attempt))
+            logger.warning(f"{path}: status {status}, retry {attempt}/{self.max_retries} in {backoff:.2f}s")
+            await asyncio.sleep(backoff)
+
+    async def _request(self, url, params, headers):
+        try:
+            async with self.session.get(url, params=params, headers=headers) as resp:
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                if resp.status == 200:
+                    return resp.status, await resp.read(), retry_after
+                return resp.status, None, retry_after
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            metrics.inc("http_network_errors_total", service="meli")
+            logger.warning(f"Network error on {url}: {e}")
+            # Errores de red se tratan como 503 para reintentar
+            return 503, None, None
+
+    async def _decode(self, body, transform, endpoint):
+        with metrics.timer("http_decode_seconds", service="meli", endpoint=endpoint):
+            if len(body) >= self.parse_thread_bytes:
+                return await asyncio.to_thread(decode, body, transform)
+            return decode(body, transform)
+
+    def reset_retry_budget(self):
+        """Vuelve a habilitar MELI_RETRY_BUDGET reintentos (el modo events lo hace por micro-batch)."""
+        self.retries = 0
+
+    def report(self):
+        logger.info(f"Meli client: {self.throttled} throttled/failed responses, {self.retries} retries")
+
+
+_clients = {}
+
+
+def get_client(credentials):
+    """Cliente compartido por cuenta: todas las etapas usan los mismos limites y el mismo pool."""
+    client = _clients.get(id(credentials))
+    if client is None:
+        client = MeliClient(http_pool.session(MELI_API_URL, limit_per_host=MELI_LIMIT_PER_HOST), credentials)
+        _clients[id(credentials)] = client
+    return client
@@ -1,93 +1,116 @@
 import asyncio
-import aiohttp
-import json
+import time
 from datetime import datetime
 
-from app.service.database import get_method, update_method, run_procedure
-from app.service.secrets import meli_secrets
+from app.service.database import update_method_async, finish_shard_async
+from app.service.product_snapshot import load_snapshot
+from app.service.checkpoint import RunJournal
+from app.service.row_hashes import RowHashIndex
+from app.service.accounts import load_accounts, item_owners, MULTI_ACCOUNT, SELLER_COLUMN
 from app.utils.logger import logger
-from app.settings.config import SCHEMA_INVENTORY, PRODUCTS_TABLE
-
-
-async def fetch_performance(session, semaphore, item_id, access_token):
-
-    async with semaphore:
-
-        url = f"https://api.mercadolibre.com/item/{item_id}/performance"
-
-        async with session.get(
-            url,
-            headers={"Authorization": f"Bearer {access_token}"}
-        ) as response:
-
-            if response.status != 200:
-                logger.error(f"{item_id}: {response.reason}")
-
-            data = await response.json()
-
-            calculated_at = data.get("calculated_at")
-
-            if "." in str(calculated_at):
-                calculated_at = datetime.strptime(
-                    calculated_at,
-                    "%Y-%m-%dT%H:%M:%S.%fZ"
-                )
-            elif calculated_at is not None:
-                calculated_at = datetime.strptime(
-                    calculated_at,
-                    "%Y-%m-%dT%H:%M:%SZ"
-                )
-            else:
-                calculated_at = datetime.now()
-
-            return {
-                "meli_id": {"value": item_id, "type": "char(50)"},
-                "entity_type": {"value": data.get("entity_type",'None'), "type": "char(50)"},
-                "score": {"value": data.get("score",0), "type": "int signed"},
-                "level": {"value": data.get("level",'None'), "type": "char(50)"},
-                "level_wording": {"value": data.get("level_wording",'None'), "type": "char(50)"},
-                "buckets": {"value": json.dumps(data.get("buckets", data)), "type": "json"},
-                "calculated_at": {"value": calculated_at, "type": "datetime"},
-                "updated_at": {"value": datetime.now(), "type": "datetime"},
-            }
+from app.utils.row_batch import RowBatch
+from app.utils import jsonutil
+from app.utils.metrics import metrics
+from app.utils.sharding import keyed_chunks, shard_filter
+from app.settings.config import CHECKPOINT_CHUNK_SIZE, SHARD_COUNT
+
+PERFORMANCE_COLUMNS = (
+    ("meli_id", "char(50)"),
+    ("entity_type", "char(50)"),
+    ("score", "int signed"),
+    ("level", "char(50)"),
+    ("level_wording", "char(50)"),
+    ("buckets", "json"),
+    ("calculated_at", "datetime"),
+    ("updated_at", "datetime"),
+)
+
+
+async def fetch_performance(client, item_id):
+
+    data, status = await client.get_json(f"/item/{item_id}/performance")
+
+    if data is None:
+        logger.error(f"{item_id}: performance request failed with status {status}")
+        return None
+
+    calculated_at = data.get("calculated_at")
+
+    if "." in str(calculated_at):
+        calculated_at = datetime.strptime(
+            calculated_at,
+            "%Y-%m-%dT%H:%M:%S.%fZ"
+        )
+    elif calculated_at is not None:
+        calculated_at = datetime.strptime(
+            calculated_at,
+            "%Y-%m-%dT%H:%M:%SZ"
+        )
+    else:
+        calculated_at = datetime.now()
+
+    # Mismo orden que PERFORMANCE_COLUMNS
+    return (
+        item_id,
+        data.get("entity_type",'None'),
+        data.get("score",0),
+        data.get("level",'None'),
+        data.get("level_wording",'None'),
+        jsonutil.dumps(data.get("buckets", data)),
+        calculated_at,
+        datetime.now(),
+    )
 
 
 async def get_performance():
 
-    access_token = meli_secrets()
-
-    query = {
-        "q_columns": [
-            "meli_id",
-        ],
-        "q_from": f"FROM {SCHEMA_INVENTORY}.{PRODUCTS_TABLE}",
-        "q_where": "WHERE status = 'active' and meli_id is not null",
-    }
-
-    active_items = [i["meli_id"] for i in get_method(query)]
-
-    logger.info(f"Getting performance of {len(active_items)} active items in Meli")
-
-    semaphore = asyncio.Semaphore(20)
-    async with aiohttp.ClientSession() as session:
-
-        tasks = [
-            fetch_performance(
-                session,
-                semaphore,
-                item_id,
-                access_token,
-            )
-            for item_id in active_items
-        ]
-
-        results = await asyncio.gather(*tasks)
-
-    items = [item for item in results if item is not None]
-
-    if items:
-        update_method(items, "mercadolibre", "performance_raw")
-        run_procedure("mercadolibre", "refresh_performance_data")
-
-def run_get_performance():
-    asyncio.run(get_performance())
\ No newline at end of file
+    accounts = await load_accounts()
+    tag_seller = MULTI_ACCOUNT
+    columns = PERFORMANCE_COLUMNS + ((SELLER_COLUMN,) if tag_seller else ())
+    journal = RunJournal("performance")
+
+    async def run_chunk(account, chunk):
+        results = await asyncio.gather(*[fetch_performance(account.client, item_id) for item_id in chunk])
+        rows = [row for row in results if row is not None]
+        if tag_seller:
+            rows = [row + (account.seller_id,) for row in rows]
+        account.track("performance", len(rows))
+        # Solo se registran los items que respondieron; los fallidos se reintentan al retomar
+        if rows:
+            journal.record([row[0] for row in rows], rows)
+        return rows
+
+    try:
+        owner_of = await item_owners(accounts)
+
+        snapshot = await load_snapshot()
+        item_ids = shard_filter(snapshot.with_status("active"))
+        logger.info(f"Getting performance of {len(item_ids)} active items in Meli")
+
+        start_time = time.perf_counter()
+        chunk_results = await asyncio.gather(*[
+            run_chunk(account, chunk)
+            for account, chunk in keyed_chunks(item_ids, CHECKPOINT_CHUNK_SIZE, owner_of, skip=journal.done_ids)
+        ])
+        for account in accounts:
+            account.report("performance", start_time)
+
+        items = RowBatch(columns)
+        items.extend(journal.rows)
+        for rows in chunk_results:
+            items.extend(rows)
+        del chunk_results
+
+        # Con sharding se marca el shard aunque no tenga items, el procedure lo corre el ultimo
+        if items or SHARD_COUNT > 1:
+            hashes = RowHashIndex("mercadolibre.performance_raw", volatile=("updated_at",))
+            try:
+                await update_method_async(hashes.changed(items), "mercadolibre", "performance_raw")
+                await finish_shard_async("mercadolibre", "refresh_performance_data", stage="performance")
+                hashes.commit()
+            finally:
+                hashes.close()
+        journal.clear()
+        metrics.inc("stage_items_total", len(items), stage="performance")
+    finally:
+        journal.close()
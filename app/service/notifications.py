@@ -0,0 +1,336 @@
+import asyncio
+import heapq
+import itertools
+import signal
+import time
+from datetime import datetime
+
+from aiohttp import web
+
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.utils.row_batch import RowBatch
+from app.service.catalog_cache import CatalogCache
+from app.service.database import update_method_async, run_procedure_async
+from app.service.accounts import load_accounts
+from app.service.meli_api import SyncContext, STATUS_COLUMNS, MULTIGET_SIZE, process_chunk
+from app.service.meli_performance import PERFORMANCE_COLUMNS, fetch_performance
+from app.settings.config import (
+    CATALOG_CACHE_TTL,
+    NOTIFICATIONS_PORT,
+    NOTIFICATIONS_PATH,
+    NOTIFICATIONS_TOPICS,
+    EVENT_DEBOUNCE_SECONDS,
+    EVENT_MAX_DELAY,
+    EVENT_BATCH_SIZE,
+    EVENT_WORKERS,
+    EVENT_PROCEDURE_INTERVAL,
+)
+
+TOPICS = {topic.strip() for topic in NOTIFICATIONS_TOPICS.split(",") if topic.strip()}
+
+
+def parse_notification(payload):
+    """{"topic": "items", "resource": "/items/MLA123", ...} -> ("items", "MLA123"), o None si no aplica."""
+    topic = payload.get("topic")
+    resource = (payload.get("resource") or "").rstrip("/")
+    if topic not in TOPICS or not resource:
+        return None
+    return topic, resource.rsplit("/", 1)[-1]
+
+
+class CoalescingQueue:
+    """
+    Cola con dedupe y debounce: las notificaciones repetidas de un mismo
+    recurso se juntan en una sola, que sale cuando pasan `debounce` segundos
+    sin notificaciones nuevas para ese recurso, o a los `max_delay` segundos
+    de la primera pendiente si el recurso se sigue notificando.
+    """
+
+    def __init__(self, debounce=EVENT_DEBOUNCE_SECONDS, max_batch=EVENT_BATCH_SIZE, max_delay=EVENT_MAX_DELAY):
+        self.debounce = debounce
+        self.max_batch = max_batch
+        self.max_delay = max(max_delay, debounce)
+        self.received = 0
+        self.coalesced = 0
+        self.closed = False
+        # key -> (primera notificacion pendiente, vencimiento)
+        self._due = {}
+        # heap de (vencimiento, seq, key); las entradas cuyo vencimiento ya no coincide con _due se descartan
+        self._heap = []
+        self._seq = itertools.count()
+        self._changed = asyncio.Event()
+
+    def __len__(self):
+        return len(self._due)
+
+    def put(self, key):
+        self.received += 1
+        if key in self._due:
+            self.coalesced += 1
+            metrics.inc("notifications_coalesced_total")
+        self._schedule(key)
+
+    def retry(self, keys):
+        """Reencola keys de un micro-batch que fallo (el debounce hace de backoff)."""
+        for key in keys:
+            self._schedule(key)
+
+    def _schedule(self, key):
+        now = time.monotonic()
+        first = self._due[key][0] if key in self._due else now
+        due = min(now + self.debounce, first + self.max_delay)
+        self._due[key] = (first, due)
+        heapq.heappush(self._heap, (due, next(self._seq), key))
+        self._changed.set()
+
+    def _next_due(self):
+        """(vencimiento, key) mas proximo, descartando entradas viejas del heap."""
+        while self._heap:
+            due, _, key = self._heap[0]
+            entry = self._due.get(key)
+            if entry is not None and entry[1] == due:
+                return due, key
+            heapq.heappop(self._heap)
+        return None
+
+    def close(self):
+        """Al cerrar, lo pendiente sale sin esperar el debounce."""
+        self.closed = True
+        self._changed.set()
+
+    async def next_batch(self):
+        """Hasta max_batch keys vencidas. Devuelve [] cuando la cola esta cerrada y vacia."""
+        while True:
+            now = time.monotonic()
+            batch = []
+            while len(batch) < self.max_batch:
+                head = self._next_due()
+                if head is None or (head[0] > now and not self.closed):
+                    break
+                heapq.heappop(self._heap)
+                del self._due[head[1]]
+                batch.append(head[1])
+            if batch:
+                return batch
+            if self.closed:
+                return []
+
+            self._changed.clear()
+            head = self._next_due()
+            timeout = head[0] - now if head else None
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+class EventProcessor:
+    """
+    Procesa micro-batches de notificaciones con la misma logica del modo batch:
+    multiget + catalogo/moderacion (process_chunk), performance de los activos
+    y escritura con update_method. Los procedures post-merge corren como
+    mucho cada EVENT_PROCEDURE_INTERVAL segundos.
+    """
+
+    def __init__(self, client, seller_id):
+        self.client = client
+        self.seller_id = seller_id
+        self.processed = 0
+        self._catalog_cache = CatalogCache()
+        self._cache_opened = time.monotonic()
+        self._procedures_pending = False
+        self._procedures_ran = time.monotonic()
+
+    async def resolve_items(self, keys):
+        """
+        Las preguntas se traducen al item al que pertenecen. Devuelve
+        (item_ids, failed): failed son las preguntas que no se pudieron leer.
+        """
+        item_ids = {resource_id for topic, resource_id in keys if topic == "items"}
+        questions = [resource_id for topic, resource_id in keys if topic == "questions"]
+        failed = []
+        for question_id, (data, status) in zip(questions, await asyncio.gather(*[
+            self.client.get_json(f"/questions/{question_id}") for question_id in questions
+        ])):
+            if data and data.get("item_id"):
+                item_ids.add(data["item_id"])
+            elif data is None and status != 404:
+                failed.append(("questions", question_id))
+        return sorted(item_ids), failed
+
+    async def handle(self, keys):
+        """Procesa un micro-batch. Devuelve las keys que fallaron, para reencolarlas."""
+        # El presupuesto de reintentos es por corrida; en un proceso de larga duracion se renueva por batch
+        self.client.reset_retry_budget()
+        item_ids, failed = await self.resolve_items(keys)
+        if not item_ids:
+            return failed
+
+        self._rotate_catalog_cache()
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        ctx = SyncContext(self.client, self.seller_id, current_time, catalog_cache=self._catalog_cache)
+
+        chunks = [item_ids[i:i + MULTIGET_SIZE] for i in range(0, len(item_ids), MULTIGET_SIZE)]
+        status_rows = RowBatch(STATUS_COLUMNS)
+        for chunk, rows in zip(chunks, await asyncio.gather(*[process_chunk(ctx, chunk) for chunk in chunks])):
+            if rows:
+                status_rows.extend(rows)
+            else:
+                # Multiget fallido: sus items se vuelven a intentar en otro batch
+                failed.extend(("items", item_id) for item_id in chunk)
+        # Sin moderacion no se puede confiar en reason/remedy: el item se vuelve a procesar
+        failed.extend(("items", item_id) for item_id in sorted(ctx.moderation_failed))
+        if not status_rows:
+            return failed
+
+        active = [row[0] for row in status_rows.rows() if row[1] == "active"]
+        performance_rows = RowBatch(PERFORMANCE_COLUMNS)
+        performance_rows.extend(
+            row for row in await asyncio.gather(*[fetch_performance(self.client, item_id) for item_id in active])
+            if row is not None
+        )
+
+        await update_method_async(status_rows, "mercadolibre", "product_status")
+        await update_method_async(performance_rows, "mercadolibre", "performance_raw")
+
+        self.processed += len(status_rows)
+        self._procedures_pending = True
+        metrics.inc("stage_items_total", len(status_rows), stage="events")
+        logger.info(
+            f"Event batch: {len(keys)} notifications -> {len(status_rows)} items, "
+            f"{len(performance_rows)} performance rows"
+        )
+        await self.run_procedures()
+        return failed
+
+    async def run_procedures(self, force=False):
+        if not self._procedures_pending:
+            return
+        if not force and time.monotonic() - self._procedures_ran < EVENT_PROCEDURE_INTERVAL:
+            return
+        # Se marca antes de esperar para que otro worker no los lance en paralelo
+        self._procedures_pending = False
+        self._procedures_ran = time.monotonic()
+        await run_procedure_async("app_import", "update_meli_status")
+        await run_procedure_async("mercadolibre", "refresh_performance_data")
+
+    @property
+    def procedures_due(self):
+        """Momento (monotonic) a partir del cual se pueden volver a correr los procedures."""
+        return self._procedures_ran + EVENT_PROCEDURE_INTERVAL
+
+    def _rotate_catalog_cache(self):
+        # Lo resuelto dentro del cache no vence, asi que se renueva cada CATALOG_CACHE_TTL
+        if time.monotonic() - self._cache_opened >= CATALOG_CACHE_TTL:
+            self._catalog_cache.close()
+            self._catalog_cache = CatalogCache()
+            self._cache_opened = time.monotonic()
+
+    async def close(self):
+        await self.run_procedures(force=True)
+        self._catalog_cache.close()
+
+
+async def event_worker(queue, processor):
+    while True:
+        keys = await queue.next_batch()
+        if not keys:
+            return
+        try:
+            failed = await processor.handle(keys)
+        except Exception as e:
+            logger.error(f"Event batch of {len(keys)} notifications failed: {e}")
+            failed = keys
+        if failed:
+            metrics.inc("notifications_failed_total", len(failed))
+            if queue.closed:
+                logger.error(f"Dropping {len(failed)} failed notifications on shutdown")
+            else:
+                logger.warning(f"Requeueing {len(failed)} notifications that could not be processed")
+                queue.retry(failed)
+
+
+async def procedure_loop(processor):
+    """
+    Corre los procedures pendientes al vencer EVENT_PROCEDURE_INTERVAL aunque
+    no lleguen mas notificaciones (handle solo los corre al terminar un batch).
+    """
+    while True:
+        wait = processor.procedures_due - time.monotonic()
+        await asyncio.sleep(wait if wait > 0 else EVENT_PROCEDURE_INTERVAL)
+        try:
+            await processor.run_procedures()
+        except Exception as e:
+            logger.error(f"Post-merge procedures failed: {e}")
+
+
+def build_app(queue, processor=None):
+    async def receive(request):
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.json_response({"error": "invalid json"}, status=400)
+
+        key = parse_notification(payload)
+        if key is None:
+            metrics.inc("notifications_ignored_total")
+        else:
+            metrics.inc("notifications_received_total", topic=key[0])
+            queue.put(key)
+        # Meli reintenta si no recibe 200 rapido: se encola y se responde enseguida
+        return web.Response(status=200)
+
+    async def health(request):
+        return web.json_response({
+            "queued": len(queue),
+            "received": queue.received,
+            "coalesced": queue.coalesced,
+            "processed": processor.processed if processor else 0,
+        })
+
+    app = web.Application()
+    app.router.add_post(NOTIFICATIONS_PATH, receive)
+    app.router.add_get("/health", health)
+    return app
+
+
+async def run_event_mode(stop=None):
+    """
+    Modo de larga duracion: recibe notificaciones de Meli en NOTIFICATIONS_PATH
+    y las procesa en micro-batches hasta recibir SIGTERM/SIGINT (o hasta que se
+    setee `stop`); ahi deja de recibir, procesa lo pendiente sin debounce y
+    corre los procedures.
+    """
+    # validate() ya rechaza varias cuentas en este modo
+    account, = await load_accounts()
+
+    queue = CoalescingQueue()
+    processor = EventProcessor(account.client, account.seller_id)
+    runner = web.AppRunner(build_app(queue, processor), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", NOTIFICATIONS_PORT).start()
+
+    stop = stop or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    workers = [asyncio.ensure_future(event_worker(queue, processor)) for _ in range(EVENT_WORKERS)]
+    procedures = asyncio.ensure_future(procedure_loop(processor))
+    logger.info(f"Listening for Meli notifications on :{NOTIFICATIONS_PORT}{NOTIFICATIONS_PATH} (topics: {sorted(TOPICS)})")
+
+    try:
+        await stop.wait()
+        logger.info(f"Shutting down, {len(queue)} notifications pending")
+    finally:
+        await runner.cleanup()
+        queue.close()
+        await asyncio.gather(*workers)
+        procedures.cancel()
+        await processor.close()
+
+    logger.info(
+        f"Event mode finished: {queue.received} notifications, {queue.coalesced} coalesced, "
+        f"{processor.processed} items written"
+    )
@@ -1,23 +1,134 @@
-from app.service.database import get_method
-from app.settings.config import SCHEMA_INVENTORY, PRODUCTS_TABLE, WEBHOOK_PUBLICATIONS, SECRET
+import asyncio
+import random
 import time
-import requests
+
+import aiohttp
+
+from app.service.database import wait_shard_done
+from app.service.product_snapshot import load_snapshot, invalidate_snapshot
+from app.service.http_pool import http_pool
+from app.utils.local_store import open_store
+from app.utils.rate_limit import TokenBucket
 from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.utils.sharding import shard_filter
+from app.settings.config import (
+    WEBHOOK_PUBLICATIONS,
+    SECRET,
+    PREPUBLISH_RATE,
+    PREPUBLISH_CONCURRENCY,
+    PREPUBLISH_MAX_RETRIES,
+    PREPUBLISH_BATCH_SIZE,
+    PREPUBLISH_RESEND_HOURS,
+    SHARD_COUNT,
+)
+
+
+class DispatchLog:
+    """Registro local de items ya enviados al webhook de prepublish."""
+
+    def __init__(self, resend_hours=PREPUBLISH_RESEND_HOURS):
+        self.resend_seconds = resend_hours * 3600
+        self._conn = open_store("prepublish")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS dispatched (
+                item_id TEXT PRIMARY KEY,
+                dispatched_at REAL NOT NULL
+            )
+        """)
+
+    def pending(self, item_ids):
+        """Filtra los items enviados hace menos de PREPUBLISH_RESEND_HOURS."""
+        cutoff = time.time() - self.resend_seconds
+        recent = {
+            row[0] for row in
+            self._conn.execute("SELECT item_id FROM dispatched WHERE dispatched_at >= ?", (cutoff,))
+        }
+        return [item_id for item_id in item_ids if str(item_id) not in recent]
+
+    def mark(self, item_ids):
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO dispatched VALUES (?, ?)",
+                [(str(item_id), now) for item_id in item_ids]
+            )
+
+    def close(self):
+        self._conn.close()
+
+
+async def post_webhook(session, payload, label):
+    """POST al webhook con reintentos ante 429/5xx y errores de red. True si fue 2xx."""
+    for attempt in range(PREPUBLISH_MAX_RETRIES + 1):
+        if attempt:
+            metrics.inc("http_retries_total", service="prepublish", endpoint="webhook")
+        started = time.perf_counter()
+        try:
+            async with session.post(url=WEBHOOK_PUBLICATIONS, json=payload) as resp:
+                metrics.observe("http_request_seconds", time.perf_counter() - started, service="prepublish", endpoint="webhook")
+                metrics.inc("http_requests_total", service="prepublish", endpoint="webhook", status=resp.status)
+                if 200 <= resp.status < 300:
+                    return True
+                body = await resp.text()
+                if resp.status != 429 and resp.status < 500:
+                    logger.error(f"Prepublish rejected for {label}: {resp.status} - {body[:200]}")
+                    return False
+                logger.warning(f"Prepublish {label}: status {resp.status} (attempt {attempt + 1})")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            metrics.inc("http_requests_total", service="prepublish", endpoint="webhook", status="network_error")
+            logger.warning(f"Prepublish {label}: network error {e} (attempt {attempt + 1})")
+
+        if attempt < PREPUBLISH_MAX_RETRIES:
+            await asyncio.sleep(random.uniform(0, 2 ** attempt))
+
+    logger.error(f"Prepublish failed for {label} after {PREPUBLISH_MAX_RETRIES + 1} attempts")
+    return False
+
+
+async def prepublish_call_ai():
+    if SHARD_COUNT > 1:
+        # update_meli_status lo corre el ultimo shard en terminar status_sync; hasta
+        # entonces los meli_id de la tabla no estan al dia para ningun shard
+        await wait_shard_done("status_sync")
+        invalidate_snapshot()
+    snapshot = await load_snapshot()
+    item_ids = shard_filter(snapshot.pending_content())
+
+    dispatch_log = DispatchLog()
+    pending_ids = dispatch_log.pending(item_ids)
+    logger.info(f"Calling Prepublish for {len(pending_ids)} items ({len(item_ids) - len(pending_ids)} already dispatched).")
+
+    # Modo batch: varios item_ids por llamada si el webhook lo soporta
+    if PREPUBLISH_BATCH_SIZE > 0:
+        groups = [pending_ids[i:i + PREPUBLISH_BATCH_SIZE] for i in range(0, len(pending_ids), PREPUBLISH_BATCH_SIZE)]
+    else:
+        groups = [[item_id] for item_id in pending_ids]
+
+    session = http_pool.session(WEBHOOK_PUBLICATIONS)
+    bucket = TokenBucket(PREPUBLISH_RATE, burst=1)
+    semaphore = asyncio.Semaphore(PREPUBLISH_CONCURRENCY)
+
+    async def dispatch(group):
+        if PREPUBLISH_BATCH_SIZE > 0:
+            pre_publish = {"event_type": "pre-publish", "item_ids": group, "secret": SECRET}
+        else:
+            pre_publish = {"event_type": "pre-publish", "item_id": group[0], "secret": SECRET}
+
+        async with semaphore:
+            await bucket.acquire()
+            logger.info(f'requesting prepublish for: {group}')
+            ok = await post_webhook(session, pre_publish, group)
+
+        if ok:
+            dispatch_log.mark(group)
+        return len(group) if ok else 0
+
+    start_time = time.perf_counter()
+    try:
+        sent = sum(await asyncio.gather(*[dispatch(group) for group in groups]))
+    finally:
+        dispatch_log.close()
 
-def prepublish_call_ai():
-    query = {
-        'q_columns': [
-            'id',
-        ],
-        'q_from':f'FROM {SCHEMA_INVENTORY}.{PRODUCTS_TABLE}',
-        'q_where': f"WHERE meli_id is null and stock > 0 and (product_name_meli IS NULL OR product_name_meli = '' OR description IS NULL OR description = '' OR brand IS NULL OR brand = '' OR model IS NULL OR model = '')",
-    }
-
-    item_ids = [i.get('id') for i in get_method(query)]
-    logger.info(f"Calling Prepublish for {len(item_ids)} items.")
-
-    for id in item_ids:
-        logger.info(f'requesting prepublish for: {id}')
-        pre_publish= {"event_type":"pre-publish", "item_id": id,"secret": SECRET}
-        requests.post(url=WEBHOOK_PUBLICATIONS, json=pre_publish)
-        time.sleep(8)
\ No newline at end of file
+    metrics.inc("stage_items_total", sent, stage="prepublish")
+    logger.info(f"Prepublish dispatched {sent}/{len(pending_ids)} items in {time.perf_counter() - start_time:.2f}s")
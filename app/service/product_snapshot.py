@@ -0,0 +1,96 @@
+import asyncio
+import time
+from app.service.database import aiter_method
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.settings.config import SCHEMA_INVENTORY, PRODUCTS_TABLE
+
+# Campos de contenido que tiene que tener un producto antes de publicarse
+CONTENT_FIELDS = ("product_name_meli", "description", "brand", "model")
+
+CONTENT_MISSING = " OR ".join(f"{field} IS NULL OR {field} = ''" for field in CONTENT_FIELDS)
+
+
+class ProductSnapshot:
+    """
+    Foto de PRODUCTS_TABLE leida una sola vez por corrida, con solo las
+    columnas que usan las etapas (id, meli_id, status, stock y si le falta
+    contenido). Cada etapa toma su lista de items de los indices en memoria
+    en lugar de volver a consultar la tabla.
+    """
+
+    def __init__(self):
+        self.total = 0
+        # status -> meli_ids publicados con ese status
+        self.by_status = {}
+        # id -> stock de los productos sin meli_id
+        self.unpublished = {}
+        # ids con algun campo de contenido vacio
+        self.missing_content = set()
+
+    def add(self, product_id, meli_id, status, stock, content_missing):
+        self.total += 1
+        if meli_id is not None:
+            self.by_status.setdefault(status, []).append(meli_id)
+        else:
+            self.unpublished[product_id] = stock or 0
+        if content_missing:
+            self.missing_content.add(product_id)
+
+    def published(self):
+        """meli_ids de todos los productos publicados, con cualquier status."""
+        return [meli_id for meli_ids in self.by_status.values() for meli_id in meli_ids]
+
+    def with_status(self, status):
+        return self.by_status.get(status, [])
+
+    def pending_content(self):
+        """ids sin publicar, con stock y con contenido incompleto (los que van a prepublish)."""
+        return [
+            product_id for product_id, stock in self.unpublished.items()
+            if stock > 0 and product_id in self.missing_content
+        ]
+
+    async def load(self):
+        query = {
+            'q_columns': [
+                'id',
+                'meli_id',
+                'status',
+                'stock',
+                f'CASE WHEN {CONTENT_MISSING} THEN 1 ELSE 0 END AS content_missing',
+            ],
+            'q_from': f'FROM {SCHEMA_INVENTORY}.{PRODUCTS_TABLE}',
+        }
+        start_time = time.perf_counter()
+        async for page in aiter_method(query):
+            for row in page:
+                self.add(*row)
+
+        metrics.set("product_snapshot_rows", self.total)
+        logger.info(
+            f"Product snapshot loaded in {time.perf_counter() - start_time:.2f}s: {self.total} products, "
+            f"{sum(map(len, self.by_status.values()))} published, {len(self.unpublished)} unpublished, "
+            f"{len(self.missing_content)} missing content"
+        )
+        return self
+
+
+_snapshot = None
+
+
+def load_snapshot():
+    """Snapshot compartido por todas las etapas: la primera que lo pide lo carga, las demas esperan."""
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = asyncio.ensure_future(ProductSnapshot().load())
+    return _snapshot
+
+
+def invalidate_snapshot():
+    """
+    Descarta el snapshot: el proximo load_snapshot vuelve a leer la tabla.
+    Se llama despues de update_meli_status, que cambia los meli_id que usa prepublish.
+    """
+    global _snapshot
+    _snapshot = None
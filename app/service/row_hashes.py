@@ -0,0 +1,85 @@
+import hashlib
+import time
+from app.utils import jsonutil
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.utils.local_store import open_store
+from app.utils.row_batch import RowBatch
+from app.settings.config import WRITE_SKIP_UNCHANGED, ROW_HASH_TTL
+
+
+def row_hash(values):
+    return hashlib.blake2b(jsonutil.dumps(values).encode(), digest_size=16).hexdigest()
+
+
+class RowHashIndex:
+    """
+    Indice local clave -> hash de las filas ya escritas en una tabla.
+
+    `changed(batch)` devuelve solo las filas cuyo contenido cambio desde la
+    ultima escritura; la primera columna es la clave y las columnas volatiles
+    (p. ej. updated_at) no entran en el hash. Los hashes se guardan con
+    `commit()` despues de que el merge salio bien. Un hash con mas de
+    ROW_HASH_TTL horas se ignora, asi cada fila se reescribe al menos una
+    vez por periodo aunque la tabla se haya tocado por fuera del job.
+    """
+
+    def __init__(self, target, volatile=(), enabled=WRITE_SKIP_UNCHANGED, ttl=ROW_HASH_TTL):
+        self.target = target
+        self.volatile = set(volatile)
+        self.enabled = bool(enabled)
+        self._stored = {}
+        self._pending = []
+        if not self.enabled:
+            return
+
+        self._conn = open_store("row_hashes")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS row_hashes (
+                target TEXT NOT NULL,
+                row_key TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                PRIMARY KEY (target, row_key)
+            )
+        """)
+        self._stored = dict(self._conn.execute(
+            "SELECT row_key, hash FROM row_hashes WHERE target = ? AND stored_at >= ?",
+            (target, time.time() - ttl * 3600)
+        ))
+
+    def changed(self, batch):
+        if not self.enabled:
+            return batch
+
+        positions = [
+            i for i, column in enumerate(batch.columns)
+            if i > 0 and column not in self.volatile
+        ]
+        changed = RowBatch(list(zip(batch.columns, batch.types)))
+        now = time.time()
+        skipped = 0
+
+        for row in batch.rows():
+            key = str(row[0])
+            digest = row_hash([row[i] for i in positions])
+            if self._stored.get(key) == digest:
+                skipped += 1
+                continue
+            changed.append(*row)
+            self._pending.append((self.target, key, digest, now))
+
+        metrics.inc("db_rows_skipped_total", skipped, target=self.target)
+        logger.info(f"{self.target}: {len(changed)} changed rows to write, {skipped} unchanged skipped")
+        return changed
+
+    def commit(self):
+        if not self.enabled or not self._pending:
+            return
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO row_hashes VALUES (?, ?, ?, ?)", self._pending)
+        self._pending = []
+
+    def close(self):
+        if self.enabled:
+            self._conn.close()
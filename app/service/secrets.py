@@ -1,13 +1,20 @@
 import json
+from functools import lru_cache
 from google.cloud import secretmanager
 from app.utils.logger import logger
 from app.settings.config import PROJECT_ID, SECRET_ID
 
-def meli_secrets():
+
+@lru_cache(maxsize=1)
+def secret_client():
+    """Un solo cliente de Secret Manager por proceso (abre un canal gRPC)."""
+    return secretmanager.SecretManagerServiceClient()
+
+
+def meli_secrets(secret_id=SECRET_ID):
     logger.info("Getting secrets from Meli Account")
-    client = secretmanager.SecretManagerServiceClient()
-    name = f"projects/{PROJECT_ID}/secrets/{SECRET_ID}/versions/latest"
-    response = client.access_secret_version(request={"name": name})
+    name = f"projects/{PROJECT_ID}/secrets/{secret_id}/versions/latest"
+    response = secret_client().access_secret_version(request={"name": name})
     response = response.payload.data.decode("UTF-8")
     response = json.loads(response)
     token = response['questions']['TOKEN']
@@ -16,4 +23,4 @@ def meli_secrets():
         return token
     else:
         logger.error("Failed to get secrets from Meli")
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,62 @@
+from app.utils.logger import logger
+from app.utils.local_store import open_store
+
+
+class StatusSyncState:
+    """
+    Estado local del status sync incremental:
+    contador de corridas, `last_updated` de Meli por item y los items cuya
+    moderacion no se pudo leer (se vuelven a pedir en la proxima corrida).
+    """
+
+    def __init__(self):
+        self._conn = open_store("status_sync")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS item_last_updated (
+                meli_id TEXT PRIMARY KEY,
+                last_updated TEXT
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS moderation_failed (
+                meli_id TEXT PRIMARY KEY
+            )
+        """)
+        row = self._conn.execute("SELECT value FROM sync_meta WHERE key = 'run_count'").fetchone()
+        self.run_count = int(row[0]) if row else None
+        self.last_updated = dict(self._conn.execute("SELECT meli_id, last_updated FROM item_last_updated"))
+        self.moderation_failed = {row[0] for row in self._conn.execute("SELECT meli_id FROM moderation_failed")}
+
+    def is_full_refresh(self, every):
+        """Corrida completa si no hay estado previo o si toca el refresh cada N corridas."""
+        if self.run_count is None:
+            logger.info("No previous sync state found, running full refresh")
+            return True
+        if every > 0 and (self.run_count + 1) % every == 0:
+            logger.info(f"Run {self.run_count + 1}: scheduled full refresh (every {every} runs)")
+            return True
+        return False
+
+    def save(self, last_updated, moderation_failed=()):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_meta VALUES ('run_count', ?)",
+                (str((self.run_count or 0) + 1),)
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO item_last_updated VALUES (?, ?)",
+                list(last_updated.items())
+            )
+            # Solo quedan los que fallaron en esta corrida; los de la anterior ya se volvieron a pedir
+            self._conn.execute("DELETE FROM moderation_failed")
+            self._conn.executemany(
+                "INSERT INTO moderation_failed VALUES (?)",
+                [(meli_id,) for meli_id in moderation_failed]
+            )
+        self._conn.close()
@@ -0,0 +1,19 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # viene en requirements.txt; el fallback es para entornos sin el (p. ej. scripts sueltos)
+    orjson = None
+
+
+def dumps(value):
+    """JSON compacto con claves ordenadas: el mismo contenido produce siempre el mismo texto."""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str).decode()
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def loads(value):
+    if orjson is not None:
+        return orjson.loads(value)
+    return json.loads(value)
@@ -0,0 +1,17 @@
+import os
+import sqlite3
+from app.settings.config import LOCAL_STATE_DIR, SHARD_SUFFIX
+
+
+def open_store(name):
+    """
+    Abre (o crea) una base SQLite local dentro de LOCAL_STATE_DIR.
+    Se usa para estado que debe sobrevivir entre corridas del job.
+    Con sharding cada shard tiene su propio archivo: sus items son siempre
+    los mismos y asi no compiten por el lock de SQLite en un volumen compartido.
+    """
+    os.makedirs(LOCAL_STATE_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(LOCAL_STATE_DIR, f"{name}{SHARD_SUFFIX}.sqlite"))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
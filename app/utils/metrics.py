@@ -0,0 +1,161 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Limites de los buckets de latencia en segundos (mismo esquema que los histogramas de Prometheus)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimacion por bucket: devuelve el limite superior del bucket que contiene el cuantil."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+def _sorted(entries):
+    # Los valores de las labels pueden mezclar tipos (p. ej. status 200 y "network_error")
+    return sorted(entries.items(), key=lambda entry: (entry[0][0], [(k, str(v)) for k, v in entry[0][1]]))
+
+
+class Metrics:
+    """
+    Contadores, gauges e histogramas en memoria para una corrida del job.
+
+    Las labels se pasan como kwargs y se guardan en el orden recibido, asi que
+    cada llamador tiene que usar siempre el mismo orden. Al final de la corrida
+    `write_report()` vuelca un JSON y un textfile de Prometheus.
+    """
+
+    def __init__(self, prefix="meli_job"):
+        self.prefix = prefix
+        self.started = time.time()
+        self._values = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(labels.items()))
+        self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        self._values[(name, tuple(labels.items()))] = value
+
+    def value(self, name, **labels):
+        return self._values.get((name, tuple(labels.items())), 0)
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(labels.items()))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram()
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        return {
+            "started_at": self.started,
+            "duration": time.time() - self.started,
+            "values": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in _sorted(self._values)
+            ],
+            "histograms": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": h.count,
+                    "sum": round(h.sum, 6),
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                    "buckets": dict(zip([*map(str, h.bounds), "+Inf"], h.counts)),
+                }
+                for (name, labels), h in _sorted(self._histograms)
+            ],
+        }
+
+    def to_prometheus(self):
+        lines = []
+
+        def fmt(labels, extra=()):
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        for (name, labels), value in _sorted(self._values):
+            lines.append(f"{self.prefix}_{name}{fmt(labels)} {value}")
+
+        typed = set()
+        for (name, labels), h in _sorted(self._histograms):
+            metric = f"{self.prefix}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(h.bounds, h.counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{fmt(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_bucket{fmt(labels, [('le', '+Inf')])} {h.count}")
+            lines.append(f"{metric}_sum{fmt(labels)} {h.sum}")
+            lines.append(f"{metric}_count{fmt(labels)} {h.count}")
+
+        lines.append(f"{self.prefix}_last_run_timestamp_seconds {time.time()}")
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, json_path, prom_path=None):
+        for path, content in (
+            (json_path, json.dumps(self.snapshot(), indent=2, default=str)),
+            (prom_path, self.to_prometheus()),
+        ):
+            if not path:
+                continue
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # Escritura atomica: el textfile collector puede leer en cualquier momento
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+    def summary(self):
+        """Lineas legibles con latencias por endpoint, para el log del final de la corrida."""
+        lines = []
+        for (name, labels), h in _sorted(self._histograms):
+            label_text = ",".join(f"{k}={v}" for k, v in labels)
+            lines.append(
+                f"{name}[{label_text}]: {h.count} obs, mean {h.sum / h.count * 1000:.0f}ms, "
+                f"p50<={h.quantile(0.5) * 1000:.0f}ms, p95<={h.quantile(0.95) * 1000:.0f}ms"
+            )
+        return lines
+
+
+metrics = Metrics()
@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Limite de requests por segundo con rafagas de hasta `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AIMDLimiter:
+    """
+    Limite de concurrencia adaptativo (additive increase / multiplicative decrease).
+
+    Cada respuesta OK suma 1/limit al limite; un throttle (429/5xx) lo divide
+    por 2 y, si vino Retry-After, frena todas las tareas hasta ese momento.
+    Los throttles que llegan durante el cooldown (hasta que vence el
+    Retry-After o pasa la latencia del request) no lo vuelven a bajar: son
+    de requests que salieron antes de la baja, no un evento nuevo.
+    """
+
+    def __init__(self, initial, minimum=1, maximum=None):
+        self.minimum = minimum
+        self.maximum = maximum or initial
+        self.limit = float(initial)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._cooldown_until = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            while True:
+                delay = self._paused_until - time.monotonic()
+                if delay > 0:
+                    self._cond.release()
+                    try:
+                        await asyncio.sleep(delay)
+                    finally:
+                        await self._cond.acquire()
+                    continue
+                if self._in_flight < int(self.limit):
+                    self._in_flight += 1
+                    return
+                await self._cond.wait()
+
+    async def release(self):
+        async with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_throttle(self, retry_after=None, latency=None):
+        now = time.monotonic()
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        if now < self._cooldown_until:
+            return
+        self.limit = max(self.minimum, self.limit / 2)
+        self._cooldown_until = now + max(retry_after or 0, latency or 0)
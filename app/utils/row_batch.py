@@ -0,0 +1,56 @@
+from itertools import islice
+
+
+class RowBatch:
+    """
+    Lote de filas con el esquema declarado una sola vez.
+
+        batch = RowBatch([("meli_id", "char(50)"), ("score", "int signed")])
+        batch.append("MLA123", 80)
+
+    Los valores se guardan por columna; `rows()` los entrega como tuplas
+    en el orden de `columns`, que es el formato que consume update_method.
+    """
+
+    __slots__ = ("columns", "types", "_values")
+
+    def __init__(self, schema):
+        self.columns = tuple(name for name, _ in schema)
+        self.types = tuple(sql_type for _, sql_type in schema)
+        self._values = tuple([] for _ in self.columns)
+
+    @classmethod
+    def from_dicts(cls, rows):
+        """Convierte el formato legacy [{"col": {"value", "type"}}] a RowBatch."""
+        first = rows[0]
+        batch = cls([(field, first[field]["type"]) for field in first])
+        for row in rows:
+            batch.append(*(row[field]["value"] for field in batch.columns))
+        return batch
+
+    def __len__(self):
+        return len(self._values[0])
+
+    def append(self, *values):
+        if len(values) != len(self.columns):
+            raise ValueError(f"Expected {len(self.columns)} values, got {len(values)}")
+        for column, value in zip(self._values, values):
+            column.append(value)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(*row)
+
+    def column(self, name):
+        return self._values[self.columns.index(name)]
+
+    def rows(self):
+        return zip(*self._values)
+
+    def iter_chunks(self, size):
+        rows = self.rows()
+        while True:
+            chunk = list(islice(rows, size))
+            if not chunk:
+                return
+            yield chunk
@@ -0,0 +1,34 @@
+import zlib
+from app.settings.config import SHARD_INDEX, SHARD_COUNT
+
+
+def shard_of(item_id, count=SHARD_COUNT):
+    """Shard estable de un item: crc32 del id, igual en cualquier proceso y corrida."""
+    return zlib.crc32(str(item_id).encode()) % count
+
+
+def shard_filter(item_ids, index=SHARD_INDEX, count=SHARD_COUNT):
+    """Se queda con los ids que le tocan a este shard (todos si no hay sharding)."""
+    if count <= 1:
+        return item_ids
+    return [item_id for item_id in item_ids if shard_of(item_id, count) == index]
+
+
+def keyed_chunks(values, size, key, skip=()):
+    """
+    Agrupa `values` en chunks de `size` elementos, salteando los de `skip`.
+    Devuelve pares (key, chunk): cada chunk tiene solo valores con la misma `key(value)`.
+    """
+    pending = {}
+    for value in values:
+        if value in skip:
+            continue
+        group = key(value)
+        chunk = pending.setdefault(group, [])
+        chunk.append(value)
+        if len(chunk) >= size:
+            yield group, chunk
+            pending[group] = []
+    for group, chunk in pending.items():
+        if chunk:
+            yield group, chunk
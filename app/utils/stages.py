@@ -0,0 +1,102 @@
+import asyncio
+import time
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+
+class Stage:
+    """Etapa del job: corrutina sin argumentos + nombres de las etapas de las que depende."""
+
+    def __init__(self, name, func, depends_on=(), enabled=True):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.enabled = enabled
+        self.started = None
+        self.finished = None
+        self.error = None
+
+    @property
+    def duration(self):
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+
+class StageScheduler:
+    """
+    Corre las etapas en cuanto sus dependencias terminan, con un maximo
+    de `max_concurrent` etapas en paralelo. Una etapa deshabilitada cuenta
+    como terminada; si una etapa falla, las que dependen de ella no corren.
+    """
+
+    def __init__(self, stages, max_concurrent=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.max_concurrent = max_concurrent or len(stages)
+
+        for stage in stages:
+            for dep in stage.depends_on:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        done = {name: asyncio.Event() for name in self.stages}
+        start = time.perf_counter()
+
+        async def run_stage(stage):
+            for dep in stage.depends_on:
+                await done[dep].wait()
+
+            try:
+                failed = [dep for dep in stage.depends_on if self.stages[dep].error is not None]
+                if failed:
+                    stage.error = f"skipped, failed dependencies: {failed}"
+                    logger.error(f"Stage {stage.name} {stage.error}")
+                    return
+                if not stage.enabled:
+                    logger.info(f"Stage {stage.name} disabled")
+                    return
+
+                async with semaphore:
+                    logger.info(f"Stage {stage.name} started")
+                    stage.started = time.perf_counter()
+                    try:
+                        await stage.func()
+                    except Exception as e:
+                        stage.error = str(e)
+                        logger.error(f"Stage {stage.name} failed: {e}")
+                    finally:
+                        stage.finished = time.perf_counter()
+                        metrics.set("stage_seconds", round(stage.duration, 3), stage=stage.name)
+                        metrics.set("stage_failed", int(stage.error is not None), stage=stage.name)
+                    logger.info(f"Stage {stage.name} finished in {stage.duration:.2f}s")
+            finally:
+                done[stage.name].set()
+
+        await asyncio.gather(*[run_stage(stage) for stage in self.stages.values()])
+        self.report(time.perf_counter() - start)
+        return self.stages
+
+    def critical_path(self):
+        """Cadena de dependencias con mayor suma de tiempos de etapa."""
+        best = {}
+
+        def longest(name):
+            if name not in best:
+                stage = self.stages[name]
+                chains = [longest(dep) for dep in stage.depends_on]
+                cost, path = max(chains, default=(0.0, []), key=lambda c: c[0])
+                best[name] = (cost + stage.duration, path + [name])
+            return best[name]
+
+        return max((longest(name) for name in self.stages), key=lambda c: c[0])
+
+    def report(self, wall_time):
+        logger.info("--- Stage timings ---")
+        for stage in self.stages.values():
+            status = "failed" if stage.error else ("skipped" if stage.started is None else "ok")
+            logger.info(f"{stage.name}: {stage.duration:.2f}s ({status})")
+        cost, path = self.critical_path()
+        logger.info(f"Critical path: {' -> '.join(path)} ({cost:.2f}s)")
+        logger.info(f"Total wall time: {wall_time:.2f}s")
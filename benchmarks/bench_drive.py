@@ -0,0 +1,51 @@
+"""
+Compara la creacion de carpetas por request individual vs batch API
+contra el stub local de Drive.
+
+    python -m benchmarks.bench_drive --items 1000 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.drive_stub import DriveStubConfig, start_stub
+
+
+async def run(args):
+    config = DriveStubConfig(args.latency, args.error_rate)
+    runner, base_url = await start_stub(config)
+
+    os.environ["DRIVE_API_URL"] = base_url
+    # Se mide la creacion, no la reutilizacion de carpetas existentes
+    os.environ.setdefault("DRIVE_FOLDER_INDEX", "0")
+
+    from app.service import google_folders
+    from app.service.credentials import StaticTokenProvider
+    from app.service.http_pool import http_pool
+
+    # El stub no valida credenciales, se evita pedir un token ADC real
+    google_folders.google_credentials = StaticTokenProvider("stub-token")
+
+    items = [{"id": 100000 + i} for i in range(args.items)]
+    try:
+        print(f"{'mode':<10} {'seconds':>8} {'items/s':>8} {'http reqs':>10} {'ok':>6}")
+        for mode, batch_size in (("single", 0), ("batch", args.batch_size)):
+            before = config.http_requests
+            start = time.perf_counter()
+            results = await google_folders.run_drive_automation(items, batch_size=batch_size)
+            duration = time.perf_counter() - start
+            print(f"{mode:<10} {duration:>8.2f} {len(results) / duration:>8.1f} "
+                  f"{config.http_requests - before:>10} {len(results):>6}")
+    finally:
+        await http_pool.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    asyncio.run(run(parser.parse_args()))
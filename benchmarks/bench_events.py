@@ -0,0 +1,129 @@
+"""
+Corre el modo eventos (run_event_mode) de punta a punta en un solo proceso:
+stub de Meli, receptor real sobre una base SQLite temporal y replay de
+notificaciones, sin Secret Manager ni MySQL.
+
+    python -m benchmarks.bench_events --notifications 5000 --items 500 --rate 200
+    python -m benchmarks.bench_events --file notifications.jsonl --debounce 2
+
+Como en bench_pipeline, las escrituras van a un INSERT OR REPLACE local
+(update_method es especifico de MySQL) y los procedures solo se cuentan.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import tempfile
+import time
+
+from benchmarks.bench_pipeline import prepare_target, sqlite_engine, sqlite_write
+from benchmarks.catalog import generate_catalog, catalog_statuses
+from benchmarks.meli_stub import StubConfig, start_stub as start_meli_stub
+from benchmarks.replay_notifications import file_notifications, replay, synthetic_notifications
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run(args):
+    catalog = generate_catalog(args.items, seed=args.seed)
+    meli_config = StubConfig(args.latency, args.error_rate, args.throttle_rate, args.retry_after,
+                             catalog=catalog_statuses(catalog))
+    meli_runner, meli_url = await start_meli_stub(meli_config)
+    state_dir = tempfile.mkdtemp(prefix="bench_events_")
+    port = free_port()
+
+    # La config se lee al importar, asi que los modulos del job se importan despues
+    os.environ["MELI_API_URL"] = meli_url
+    os.environ["MELI_STATIC_TOKEN"] = "stub-token"
+    os.environ["LOCAL_STATE_DIR"] = state_dir
+    os.environ["PORT"] = str(port)
+    os.environ["EVENT_DEBOUNCE_SECONDS"] = str(args.debounce)
+    os.environ.setdefault("SCHEMA_INVENTORY", "inventory")
+    os.environ.setdefault("PRODUCTS_TABLE", "products")
+
+    from app.service import database, notifications
+    from app.service.http_pool import http_pool
+    from app.service.meli_api import STATUS_COLUMNS
+    from app.service.meli_performance import PERFORMANCE_COLUMNS
+
+    database.engine = sqlite_engine(state_dir)
+    prepare_target(database.engine, catalog, (
+        ("mercadolibre", "product_status", STATUS_COLUMNS),
+        ("mercadolibre", "performance_raw", PERFORMANCE_COLUMNS),
+    ), mysql=False)
+
+    written = {}
+    procedures = []
+
+    async def write(rows, schema, table, strategy=None):
+        if not rows:
+            return
+        written[table] = written.get(table, 0) + len(rows)
+        await asyncio.to_thread(sqlite_write, database.engine, rows, schema, table)
+
+    async def procedure(schema, procedure_name):
+        procedures.append(f"{schema}.{procedure_name}")
+
+    notifications.update_method_async = write
+    notifications.run_procedure_async = procedure
+
+    if args.file:
+        payloads = list(file_notifications(args.file))
+    else:
+        payloads = list(synthetic_notifications(args.notifications, args.items, args.questions))
+
+    stop = asyncio.Event()
+    receiver = asyncio.ensure_future(notifications.run_event_mode(stop))
+    start = time.perf_counter()
+    try:
+        # El receptor primero resuelve /users/me; se espera a que acepte conexiones
+        while not receiver.done():
+            try:
+                _, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.close()
+                break
+            except OSError:
+                await asyncio.sleep(0.05)
+        health = await replay(f"http://127.0.0.1:{port}", "/notifications", payloads, args.rate, args.timeout)
+    finally:
+        stop.set()
+        await receiver
+        duration = time.perf_counter() - start
+        await http_pool.close()
+        await meli_runner.cleanup()
+
+    print(f"receiver: {health}")
+    if health["received"]:
+        print(f"coalesced {health['coalesced'] / health['received']:.0%} of the notifications")
+    print(f"rows written: {written}, procedures: {len(procedures)}, {duration:.2f}s")
+    print(f"meli stub: {meli_config.requests} requests, {meli_config.throttled} throttled, {meli_config.errors} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", help="JSONL con una notificacion por linea")
+    parser.add_argument("--notifications", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=300)
+    parser.add_argument("--questions", type=float, default=0.1, help="fraccion de notificaciones de preguntas")
+    parser.add_argument("--rate", type=float, default=200, help="notificaciones por segundo (0 = sin limite)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--debounce", type=float, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level)
+    logging.getLogger().setLevel(args.log_level)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
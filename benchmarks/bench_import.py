@@ -0,0 +1,77 @@
+"""
+Costo de arranque del job medido con `python -X importtime`: tiempo de
+importar main.py y lo que agrega cada etapa al importarse despues.
+
+    python -m benchmarks.bench_import --repeat 5
+    python -m benchmarks.bench_import --top 20
+
+Cada medicion corre en un proceso nuevo (sin modulos ya cargados), asi que
+los numeros se parecen a un cold start de Cloud Run.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+STAGE_MODULES = (
+    "app.service.meli_api",
+    "app.service.prepublish_api",
+    "app.service.meli_performance",
+    "app.service.google_folders",
+    "app.service.notifications",
+)
+
+# Dependencias pesadas que main.py no deberia importar hasta que corre una etapa
+HEAVY_MODULES = ("sqlalchemy", "google.cloud.sql.connector", "google.cloud.secretmanager", "google.auth", "requests")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def importtime(code):
+    """Corre `code` con -X importtime y devuelve {modulo: (self_us, cumulative_us)} y los modulos cargados."""
+    probe = f"{code}\nimport sys\nprint('\\n'.join(sys.modules))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        capture_output=True, text=True, cwd=ROOT, check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times, set(proc.stdout.split())
+
+
+def cost(code, repeat):
+    """Mediana de los us de import de `code` (suma de `self` de todos los modulos)."""
+    return statistics.median(
+        sum(self_us for self_us, _ in importtime(code)[0].values()) for _ in range(repeat)
+    )
+
+
+def run(args):
+    total = cost("import main", args.repeat)
+    times, loaded = importtime("import main")
+    print(f"import main: {total / 1000:.1f}ms (mediana de {args.repeat})")
+
+    heavy = [module for module in HEAVY_MODULES if module in loaded]
+    print(f"dependencias pesadas cargadas por main: {', '.join(heavy) if heavy else 'ninguna'}")
+
+    print(f"\n{'modulo':<45} {'self ms':>8} {'acum ms':>8}")
+    for name, (self_us, cumulative_us) in sorted(times.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f"{name:<45} {self_us / 1000:>8.1f} {cumulative_us / 1000:>8.1f}")
+
+    print(f"\n{'etapa':<45} {'extra ms':>8}")
+    for module in STAGE_MODULES:
+        # Lo que agrega importar la etapa con main ya importado
+        extra = cost(f"import main\nimport {module}", args.repeat) - total
+        print(f"{module:<45} {extra / 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    run(parser.parse_args())
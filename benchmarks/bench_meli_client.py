@@ -0,0 +1,46 @@
+"""
+Corre MeliClient contra el stub local con throttling inyectado.
+
+    python -m benchmarks.bench_meli_client --items 2000 --throttle-rate 0.1
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from app.service.credentials import StaticTokenProvider
+from app.service.meli_client import MeliClient
+from benchmarks.meli_stub import StubConfig, start_stub
+
+
+async def run(args):
+    config = StubConfig(args.latency, args.error_rate, args.throttle_rate, args.retry_after)
+    runner, base_url = await start_stub(config)
+    try:
+        async with aiohttp.ClientSession() as session:
+            client = MeliClient(session, StaticTokenProvider("stub-token"), base_url=base_url)
+            item_ids = [f"MLA{1000000 + i}" for i in range(args.items)]
+
+            start = time.perf_counter()
+            results = await asyncio.gather(*[
+                client.get_json(f"/item/{item_id}/performance") for item_id in item_ids
+            ])
+            duration = time.perf_counter() - start
+
+        ok = sum(1 for data, _ in results if data is not None)
+        print(f"items: {args.items}  ok: {ok}  lost: {args.items - ok}")
+        print(f"stub requests: {config.requests}  throttled: {config.throttled}  errors: {config.errors}")
+        print(f"client retries: {client.retries}  elapsed: {duration:.2f}s  ({ok / duration:.1f} items/s)")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.1)
+    parser.add_argument("--retry-after", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,112 @@
+"""
+Mide bytes y CPU del multiget de /items con body completo vs proyectado con
+`attributes`, y el parseo con json de la stdlib vs jsonutil (orjson si esta
+instalado).
+
+    python -m benchmarks.bench_payloads --chunks 200
+    python -m benchmarks.bench_payloads --file multigets.jsonl
+
+Con --file se usan respuestas grabadas de /items?ids=... (una por linea, el
+JSON tal cual lo devolvio la API); si no, se generan con el stub de Meli.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import time
+
+from app.service.meli_api import summarize_items
+from app.service.meli_client import decode
+from app.settings.config import MELI_ITEM_ATTRIBUTES
+from app.utils import jsonutil
+from benchmarks.meli_stub import full_item, project
+
+
+def synthetic_payloads(chunks, size=20):
+    payloads = []
+    for c in range(chunks):
+        ids = [f"MLA{1000000 + c * size + i}" for i in range(size)]
+        payloads.append([{"code": 200, "body": full_item(item_id)} for item_id in ids])
+    return payloads
+
+
+def recorded_payloads(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def projected(payload, attributes):
+    return [{**entry, "body": project(entry.get("body") or {}, attributes)} for entry in payload]
+
+
+def cpu_per_pass(bodies, loads, repeat):
+    """Segundos de CPU para parsear y resumir todas las respuestas una vez."""
+    start = time.process_time()
+    for _ in range(repeat):
+        for body in bodies:
+            summarize_items(loads(body))
+    return (time.process_time() - start) / repeat
+
+
+async def max_loop_lag(body, offload):
+    """Mayor demora de un tick de 1ms mientras se parsea `body` (inline o en un thread)."""
+    lag = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal lag
+        while not done:
+            before = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lag = max(lag, time.perf_counter() - before - 0.001)
+
+    task = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0.01)
+    if offload:
+        await asyncio.to_thread(decode, body, summarize_items)
+    else:
+        decode(body, summarize_items)
+    done = True
+    await task
+    return lag
+
+
+def main(args):
+    payloads = recorded_payloads(args.file) if args.file else synthetic_payloads(args.chunks)
+    variants = {
+        "full": [json.dumps(p).encode() for p in payloads],
+        "projected": [json.dumps(projected(p, args.attributes)).encode() for p in payloads],
+    }
+    items = sum(len(p) for p in payloads)
+    parser_name = "orjson" if jsonutil.orjson is not None else "json (orjson no instalado)"
+    print(f"{len(payloads)} multigets, {items} items, attributes={args.attributes}")
+    print(f"{'payload':<10} {'MB':>8} {'MB gzip':>8} {'json ms':>9} {'jsonutil ms':>12}")
+
+    results = {}
+    for name, bodies in variants.items():
+        raw = sum(map(len, bodies))
+        zipped = sum(len(gzip.compress(body)) for body in bodies)
+        stdlib = cpu_per_pass(bodies, json.loads, args.repeat)
+        fast = cpu_per_pass(bodies, jsonutil.loads, args.repeat)
+        results[name] = (raw, stdlib, fast)
+        print(f"{name:<10} {raw / 1e6:>8.2f} {zipped / 1e6:>8.2f} {stdlib * 1000:>9.1f} {fast * 1000:>12.1f}")
+
+    (full_bytes, full_cpu, _), (lean_bytes, _, lean_cpu) = results["full"], results["projected"]
+    print(f"parser: {parser_name}")
+    print(f"bytes saved: {1 - lean_bytes / full_bytes:.0%}, "
+          f"CPU saved (full+json -> projected+jsonutil): {1 - lean_cpu / full_cpu:.0%}")
+
+    # Cuanto frena el event loop la respuesta mas grande, sin proyeccion
+    big = max(variants["full"], key=len)
+    inline = asyncio.run(max_loop_lag(big, offload=False))
+    threaded = asyncio.run(max_loop_lag(big, offload=True))
+    print(f"event loop lag parsing {len(big) / 1e6:.1f} MB: inline {inline * 1000:.1f}ms, thread {threaded * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--file", help="JSONL con respuestas grabadas del multiget")
+    parser.add_argument("--attributes", default=MELI_ITEM_ATTRIBUTES)
+    parser.add_argument("--repeat", type=int, default=5)
+    main(parser.parse_args())
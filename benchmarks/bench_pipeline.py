@@ -0,0 +1,359 @@
+"""
+Corre las etapas del job de punta a punta contra los stubs locales de Meli
+y Drive y una base local, sin tocar servicios de produccion.
+
+    python -m benchmarks.bench_pipeline --items 5000 --throttle-rate 0.05
+    python -m benchmarks.bench_pipeline --db mysql      # usa BENCH_MYSQL_DSN
+    python -m benchmarks.bench_pipeline --compare a1b2c3d
+
+Por etapa reporta items/s, latencia p50/p95 de los requests (vista desde el
+cliente, incluye rate limiting y reintentos) y pico de RSS. El resultado se
+guarda en benchmarks/results/<commit>.json para comparar entre commits.
+
+Con --db sqlite (default) las lecturas usan el cursor real de database.py
+sobre SQLite y las escrituras van a un INSERT OR REPLACE local, porque
+update_method es especifico de MySQL. Con --db mysql todo pasa por
+update_method/finish_shard reales (los procedures se crean vacios).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.catalog import generate_catalog, catalog_statuses
+from benchmarks.drive_stub import DriveStubConfig, start_stub as start_drive_stub
+from benchmarks.meli_stub import StubConfig, start_stub as start_meli_stub
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+SCHEMAS = ("inventory", "mercadolibre", "app_import")
+PROCEDURES = ("app_import.update_meli_status", "mercadolibre.refresh_performance_data")
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Sin /proc (macOS) solo se tiene el pico del proceso completo
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[round(q * (len(ordered) - 1))]
+
+
+class StageProbe:
+    """Mediciones de una etapa: items escritos, latencias de requests y pico de RSS."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.latencies = []
+        self.peak_rss = rss_mb()
+
+    async def sample_rss(self, interval=0.05):
+        while True:
+            self.peak_rss = max(self.peak_rss, rss_mb())
+            await asyncio.sleep(interval)
+
+    def summary(self, seconds):
+        return {
+            "items": self.items,
+            "seconds": round(seconds, 3),
+            "items_per_s": round(self.items / seconds, 1) if seconds > 0 else 0.0,
+            "requests": len(self.latencies),
+            "p50_ms": round(percentile(self.latencies, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(self.latencies, 0.95) * 1000, 1),
+            "peak_rss_mb": round(self.peak_rss, 1),
+        }
+
+
+current = StageProbe("setup")
+
+
+def timed(func):
+    """Envuelve una corrutina para registrar su latencia en la etapa actual."""
+
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            current.latencies.append(time.perf_counter() - start)
+
+    return wrapper
+
+
+def table_ddl(schema, table, columns):
+    fields = ", ".join(f"{name} {sql_type}" for name, sql_type in columns)
+    return f"CREATE TABLE IF NOT EXISTS {schema}.{table} ({fields}, PRIMARY KEY ({columns[0][0]}))"
+
+
+def sqlite_engine(directory):
+    from sqlalchemy import create_engine, event
+
+    engine = create_engine(f"sqlite:///{directory}/main.sqlite", connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def attach_schemas(dbapi_conn, _):
+        for schema in SCHEMAS:
+            dbapi_conn.execute(f"ATTACH DATABASE '{directory}/{schema}.sqlite' AS {schema}")
+
+    return engine
+
+
+def sqlite_value(value):
+    return value.isoformat(sep=" ") if isinstance(value, datetime) else value
+
+
+def sqlite_write(engine, rows, schema, table):
+    placeholders = ", ".join("?" * len(rows.columns))
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            f"INSERT OR REPLACE INTO {schema}.{table} ({', '.join(rows.columns)}) VALUES ({placeholders})",
+            [tuple(sqlite_value(value) for value in row) for row in rows.rows()],
+        )
+
+
+def prepare_target(engine, catalog, targets, mysql):
+    from sqlalchemy import text
+
+    with engine.begin() as conn:
+        if mysql:
+            for schema in SCHEMAS:
+                conn.execute(text(f"CREATE DATABASE IF NOT EXISTS {schema}"))
+            for procedure in PROCEDURES:
+                conn.execute(text(f"DROP PROCEDURE IF EXISTS {procedure}"))
+                conn.execute(text(f"CREATE PROCEDURE {procedure}() BEGIN END"))
+
+        conn.execute(text(f"DROP TABLE IF EXISTS {os.environ['SCHEMA_INVENTORY']}.{os.environ['PRODUCTS_TABLE']}"))
+        conn.execute(text(table_ddl(os.environ["SCHEMA_INVENTORY"], os.environ["PRODUCTS_TABLE"], (
+            ("id", "integer"),
+            ("sku", "varchar(50)"),
+            ("meli_id", "varchar(50)"),
+            ("status", "varchar(50)"),
+            ("stock", "integer"),
+            ("product_name_meli", "varchar(255)"),
+            ("description", "text"),
+            ("brand", "varchar(100)"),
+            ("model", "varchar(100)"),
+        ))))
+        conn.execute(
+            text(f"INSERT INTO {os.environ['SCHEMA_INVENTORY']}.{os.environ['PRODUCTS_TABLE']} "
+                 "(id, sku, meli_id, status, stock, product_name_meli, description, brand, model) "
+                 "VALUES (:id, :sku, :meli_id, :status, :stock, :product_name_meli, :description, :brand, :model)"),
+            catalog,
+        )
+        # Tabla que recorre el pipeline de Drive (keyset sobre id, solo items con stock y sin drive_url)
+        conn.execute(text(f"DROP TABLE IF EXISTS {os.environ['SCHEMA_INVENTORY']}.product_catalog_sync"))
+        conn.execute(text(table_ddl(os.environ["SCHEMA_INVENTORY"], "product_catalog_sync", (
+            ("id", "integer"),
+            ("stock", "integer"),
+            ("drive_url", "varchar(255)"),
+        ))))
+        conn.execute(
+            text(f"INSERT INTO {os.environ['SCHEMA_INVENTORY']}.product_catalog_sync (id, stock) VALUES (:id, :stock)"),
+            [{"id": row["id"], "stock": row["stock"]} for row in catalog],
+        )
+        for schema, table, columns in targets:
+            conn.execute(text(f"DROP TABLE IF EXISTS {schema}.{table}"))
+            conn.execute(text(table_ddl(schema, table, columns)))
+
+
+def sqlite_folder_urls(engine, data_list):
+    """load_item_folder_url para SQLite (la version real usa UPDATE ... JOIN de MySQL)."""
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            f"UPDATE {os.environ['SCHEMA_INVENTORY']}.product_catalog_sync SET drive_url = ? WHERE id = ?",
+            [(row["drive_url"], row["item_id"]) for row in data_list],
+        )
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{revision}-dirty" if dirty else revision
+
+
+def compare(results, base_name):
+    path = os.path.join(RESULTS_DIR, f"{base_name}.json")
+    with open(path) as f:
+        base = json.load(f)
+
+    print(f"\nvs {base['revision']}:")
+    print(f"{'stage':<14} {'items/s':>18} {'p95 ms':>18} {'peak rss MB':>18}")
+    for name, stage in results["stages"].items():
+        old = base["stages"].get(name)
+        if not old:
+            continue
+        cells = []
+        for key in ("items_per_s", "p95_ms", "peak_rss_mb"):
+            delta = (stage[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            cells.append(f"{old[key]:>7} -> {stage[key]:<7}{delta:+.0f}%")
+        print(f"{name:<14} " + " ".join(f"{cell:>18}" for cell in cells))
+
+
+async def run(args):
+    catalog = generate_catalog(args.items, seed=args.seed)
+    meli_config = StubConfig(args.latency, args.error_rate, args.throttle_rate, args.retry_after,
+                             catalog=catalog_statuses(catalog))
+    drive_config = DriveStubConfig(args.drive_latency, args.error_rate, args.throttle_rate)
+    meli_runner, meli_url = await start_meli_stub(meli_config)
+    drive_runner, drive_url = await start_drive_stub(drive_config)
+    state_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+
+    # La config se lee al importar, asi que los modulos del job se importan despues
+    os.environ["MELI_API_URL"] = meli_url
+    os.environ["DRIVE_API_URL"] = drive_url
+    os.environ["LOCAL_STATE_DIR"] = state_dir
+    os.environ["CHECKPOINT_ENABLED"] = "0"
+    os.environ.setdefault("DRIVE_FOLDER_INDEX", "0")
+    os.environ.setdefault("SCHEMA_INVENTORY", "inventory")
+    os.environ.setdefault("PRODUCTS_TABLE", "products")
+    if args.db == "mysql":
+        os.environ["DB_DSN"] = os.environ["BENCH_MYSQL_DSN"]
+
+    from app.service import accounts, database, google_folders, meli_api, meli_performance
+    from app.service.credentials import StaticTokenProvider
+    from app.service.http_pool import http_pool
+    from app.service.meli_client import MeliClient
+
+    global current
+    token = StaticTokenProvider("stub-token")
+    # Sin MELI_ACCOUNTS el job usa una sola cuenta con meli_credentials
+    accounts.meli_credentials = token
+    google_folders.google_credentials = token
+    MeliClient.get_json = timed(MeliClient.get_json)
+    google_folders.authorized_request = timed(google_folders.authorized_request)
+
+    targets = (
+        ("mercadolibre", "product_status", meli_api.STATUS_COLUMNS),
+        ("mercadolibre", "performance_raw", meli_performance.PERFORMANCE_COLUMNS),
+    )
+    if args.db == "mysql":
+        write = database.update_method_async
+        procedure = database.finish_shard_async
+    else:
+        database.engine = sqlite_engine(state_dir)
+
+        async def write(rows, schema, table, strategy=None):
+            await asyncio.to_thread(sqlite_write, database.engine, rows, schema, table)
+
+        async def procedure(schema, procedure_name, stage=None):
+            return None
+
+        google_folders.load_item_folder_url = lambda data_list: sqlite_folder_urls(database.engine, data_list)
+
+    async def counted_write(rows, schema, table, strategy=None):
+        current.items += len(rows)
+        await write(rows, schema, table, strategy)
+
+    for module in (meli_api, meli_performance):
+        module.update_method_async = counted_write
+        module.finish_shard_async = procedure
+
+    prepare_target(database.engine, catalog, targets, args.db == "mysql")
+
+    async def drive_folders():
+        # El mismo camino que main.py: lectura keyset, cola acotada y flush de drive_url en micro-batches
+        stats = await google_folders.run_drive_pipeline(batch_size=args.batch_size)
+        current.items += stats["written"]
+
+    stages = {
+        "status_sync": meli_api.product_status_sync,
+        "performance": meli_performance.get_performance,
+        "drive_folders": drive_folders,
+    }
+    results = {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "args": vars(args),
+        "stages": {},
+    }
+
+    try:
+        for name in args.stages.split(","):
+            current = StageProbe(name)
+            sampler = asyncio.create_task(current.sample_rss())
+            start = time.perf_counter()
+            try:
+                await stages[name]()
+            finally:
+                duration = time.perf_counter() - start
+                sampler.cancel()
+            results["stages"][name] = current.summary(duration)
+    finally:
+        await http_pool.close()
+        await meli_runner.cleanup()
+        await drive_runner.cleanup()
+
+    results["stubs"] = {
+        "meli_requests": meli_config.requests,
+        "meli_throttled": meli_config.throttled,
+        "meli_errors": meli_config.errors,
+        "drive_requests": drive_config.http_requests,
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", default="status_sync,performance,drive_folders")
+    parser.add_argument("--db", choices=("sqlite", "mysql"), default="sqlite")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--drive-latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--compare", help="revision de un resultado previo en benchmarks/results")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level)
+    logging.getLogger().setLevel(args.log_level)
+
+    results = asyncio.run(run(args))
+
+    print(f"\n{'stage':<14} {'items':>7} {'seconds':>8} {'items/s':>8} {'reqs':>7} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'rss MB':>7}")
+    for name, stage in results["stages"].items():
+        print(f"{name:<14} {stage['items']:>7} {stage['seconds']:>8} {stage['items_per_s']:>8} "
+              f"{stage['requests']:>7} {stage['p50_ms']:>7} {stage['p95_ms']:>7} {stage['peak_rss_mb']:>7}")
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{results['revision']}.json")
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved {path}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
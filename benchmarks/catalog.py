@@ -0,0 +1,33 @@
+"""
+Catalogo sintetico para los benchmarks: filas de la tabla de productos
+con una mezcla de items publicados/no publicados y de estados en Meli.
+"""
+import random
+
+STATUSES = ("paused", "under_review", "closed")
+
+
+def generate_catalog(count, seed=0, published=0.9, active=0.7, missing_content=0.3):
+    """
+    Lista de dicts id, sku, meli_id, status, stock y campos de contenido
+    (vacios en una parte de los no publicados). Mismo seed -> mismo catalogo.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        is_published = rng.random() < published
+        rows.append({
+            "id": i + 1,
+            "sku": f"SKU-{i:07d}",
+            "meli_id": f"MLA{1000000000 + i}" if is_published else None,
+            "status": ("active" if rng.random() < active else rng.choice(STATUSES)) if is_published else None,
+            "stock": rng.randint(0, 50),
+        })
+        content = None if not is_published and rng.random() < missing_content else f"contenido {i}"
+        rows[-1].update(product_name_meli=content, description=content, brand="Marca", model=f"M{i % 97}")
+    return rows
+
+
+def catalog_statuses(rows):
+    """meli_id -> status, para que el stub de Meli responda lo mismo que dice la tabla."""
+    return {row["meli_id"]: row["status"] for row in rows if row["meli_id"]}
@@ -0,0 +1,155 @@
+"""
+Servidor aiohttp que imita la API de Drive v3 para creacion de carpetas.
+
+    python -m benchmarks.drive_stub --port 8082 --error-rate 0.05
+
+Con DRIVE_API_URL=http://127.0.0.1:8082 google_folders apunta al stub.
+Soporta POST /drive/v3/files, POST /batch/drive/v3 (multipart/mixed),
+GET /drive/v3/files (files.list por parent) y la API de changes.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import uuid
+
+from aiohttp import web
+
+
+class DriveStubConfig:
+
+    def __init__(self, latency=0.05, error_rate=0.0, throttle_rate=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.http_requests = 0
+        self.created = 0
+        self.part_errors = 0
+        self.folders = {}
+        self.changes = []
+
+
+def create_folder(config, payload):
+    """Devuelve (status, body) para la creacion de una carpeta."""
+    if random.random() < config.throttle_rate:
+        return 429, {"error": {"code": 429, "message": "User rate limit exceeded"}}
+    if random.random() < config.error_rate:
+        config.part_errors += 1
+        return 500, {"error": {"code": 500, "message": "Internal error"}}
+
+    folder_id = uuid.uuid4().hex
+    folder = {"id": folder_id, **payload}
+    config.folders[folder_id] = folder
+    config.changes.append({"fileId": folder_id, "removed": False, "file": folder})
+    config.created += 1
+    return 200, {"id": folder_id, "name": payload.get("name"), "mimeType": payload.get("mimeType")}
+
+
+async def files(request):
+    config = request.app["config"]
+    config.http_requests += 1
+    await asyncio.sleep(config.latency)
+    status, body = create_folder(config, await request.json())
+    return web.json_response(body, status=status)
+
+
+async def batch(request):
+    config = request.app["config"]
+    config.http_requests += 1
+    # Un batch tarda algo mas que un request simple, pero mucho menos que N
+    await asyncio.sleep(config.latency * 2)
+
+    boundary = f"batch_{uuid.uuid4().hex}"
+    parts = []
+    reader = await request.multipart()
+    async for part in reader:
+        content_id = part.headers.get("Content-ID", "<>").strip("<>")
+        embedded = await part.text()
+        body = re.split(r"\r?\n\r?\n", embedded, maxsplit=1)[1]
+        status, data = create_folder(config, json.loads(body))
+        parts.append(
+            f"--{boundary}\r\n"
+            "Content-Type: application/http\r\n"
+            f"Content-ID: <response-{content_id}>\r\n"
+            "\r\n"
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+            "Content-Type: application/json; charset=UTF-8\r\n"
+            "\r\n"
+            f"{json.dumps(data)}\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n")
+    return web.Response(
+        body="".join(parts).encode("utf-8"),
+        headers={"Content-Type": f"multipart/mixed; boundary={boundary}"},
+    )
+
+
+async def list_files(request):
+    config = request.app["config"]
+    config.http_requests += 1
+    await asyncio.sleep(config.latency)
+
+    parent = re.search(r"'([^']+)' in parents", request.query.get("q", ""))
+    matches = [
+        {"id": f["id"], "name": f["name"]}
+        for f in config.folders.values()
+        if parent is None or parent.group(1) in f.get("parents", [])
+    ]
+    offset = int(request.query.get("pageToken", 0))
+    page_size = int(request.query.get("pageSize", 100))
+    body = {"files": matches[offset:offset + page_size]}
+    if offset + page_size < len(matches):
+        body["nextPageToken"] = str(offset + page_size)
+    return web.json_response(body)
+
+
+async def start_page_token(request):
+    return web.json_response({"startPageToken": str(len(request.app["config"].changes))})
+
+
+async def list_changes(request):
+    config = request.app["config"]
+    config.http_requests += 1
+    offset = int(request.query["pageToken"])
+    page_size = int(request.query.get("pageSize", 100))
+    body = {"changes": config.changes[offset:offset + page_size]}
+    if offset + page_size < len(config.changes):
+        body["nextPageToken"] = str(offset + page_size)
+    else:
+        body["newStartPageToken"] = str(len(config.changes))
+    return web.json_response(body)
+
+
+def build_app(config=None):
+    app = web.Application()
+    app["config"] = config or DriveStubConfig()
+    app.router.add_post("/drive/v3/files", files)
+    app.router.add_post("/batch/drive/v3", batch)
+    app.router.add_get("/drive/v3/files", list_files)
+    app.router.add_get("/drive/v3/changes/startPageToken", start_page_token)
+    app.router.add_get("/drive/v3/changes", list_changes)
+    return app
+
+
+async def start_stub(config=None, port=0):
+    """Levanta el stub en segundo plano. Devuelve (runner, base_url)."""
+    runner = web.AppRunner(build_app(config), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    web.run_app(
+        build_app(DriveStubConfig(args.latency, args.error_rate, args.throttle_rate)),
+        host="127.0.0.1", port=args.port,
+    )
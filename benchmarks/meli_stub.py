@@ -0,0 +1,198 @@
+"""
+Servidor aiohttp que imita los endpoints de Mercado Libre que usa el job.
+
+    python -m benchmarks.meli_stub --port 8081 --throttle-rate 0.2
+
+Con MELI_API_URL=http://127.0.0.1:8081 el job completo apunta al stub.
+"""
+import argparse
+import asyncio
+import random
+
+from aiohttp import web
+
+
+class StubConfig:
+
+    def __init__(self, latency=0.02, error_rate=0.0, throttle_rate=0.0, retry_after=1, catalog=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        # meli_id -> status, p. ej. de benchmarks.catalog.generate_catalog
+        self.catalog = catalog or {}
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+
+
+def fake_item(item_id, status=None):
+    seed = sum(map(ord, item_id))
+    status = status or ("active", "paused", "under_review")[seed % 3]
+    variations = [
+        {
+            "id": seed * 10 + v,
+            "available_quantity": (seed + v) % 7,
+            "price": 1000 + v,
+            "attribute_combinations": [{"id": "COLOR", "value_name": f"color_{v}"}],
+        }
+        for v in range(seed % 3)
+    ]
+    return {
+        "id": item_id,
+        "status": status,
+        "variations": variations,
+        "catalog_product_id": f"MLA{seed % 50}" if seed % 2 else None,
+        "last_updated": "2026-01-01T00:00:00.000Z",
+    }
+
+
+def full_item(item_id, status=None):
+    """fake_item con el resto del body real de /items: fotos, atributos, descripcion, envio."""
+    item = fake_item(item_id, status)
+    seed = sum(map(ord, item_id))
+    for variation in item["variations"]:
+        variation["picture_ids"] = [f"{seed}-{p}-MLA" for p in range(4)]
+        variation["attributes"] = [{"id": "SELLER_SKU", "value_name": f"SKU-{variation['id']}"}]
+        variation["sold_quantity"] = seed % 40
+    item.update({
+        "site_id": "MLA",
+        "title": f"Producto de prueba {item_id} " + "con titulo largo " * 3,
+        "seller_id": 123456,
+        "category_id": f"MLA{seed % 900}",
+        "price": 1000 + seed % 500,
+        "currency_id": "ARS",
+        "available_quantity": sum(v["available_quantity"] for v in item["variations"]),
+        "permalink": f"https://articulo.mercadolibre.com.ar/{item_id}",
+        "pictures": [
+            {
+                "id": f"{seed}-{p}-MLA",
+                "url": f"http://http2.mlstatic.com/D_{seed}_{p}-O.jpg",
+                "secure_url": f"https://http2.mlstatic.com/D_{seed}_{p}-O.jpg",
+                "size": "500x500",
+                "max_size": "1200x1200",
+            }
+            for p in range(8)
+        ],
+        "attributes": [
+            {
+                "id": f"ATTR_{a}",
+                "name": f"Atributo {a}",
+                "value_id": str(seed + a),
+                "value_name": f"valor {a}",
+                "values": [{"id": str(seed + a), "name": f"valor {a}", "struct": None}],
+                "attribute_group_id": "OTHERS",
+            }
+            for a in range(25)
+        ],
+        "descriptions": [{"id": f"{item_id}-9"}],
+        "plain_text": "Descripcion del producto. " * 40,
+        "shipping": {"mode": "me2", "free_shipping": bool(seed % 2), "logistic_type": "fulfillment", "tags": ["fulfillment"]},
+        "tags": ["good_quality_picture", "immediate_payment", "cart_eligible"],
+    })
+    return item
+
+
+def project(body, attributes):
+    """Imita el parametro `attributes` de la API: solo las claves pedidas."""
+    if not attributes:
+        return body
+    return {key: body[key] for key in attributes.split(",") if key in body}
+
+
+@web.middleware
+async def fault_injection(request, handler):
+    config = request.app["config"]
+    config.requests += 1
+    await asyncio.sleep(config.latency)
+
+    if random.random() < config.throttle_rate:
+        config.throttled += 1
+        return web.json_response(
+            {"message": "Too Many Requests"}, status=429,
+            headers={"Retry-After": str(config.retry_after)},
+        )
+    if random.random() < config.error_rate:
+        config.errors += 1
+        return web.json_response({"message": "internal error"}, status=500)
+    return await handler(request)
+
+
+async def users_me(request):
+    return web.json_response({"id": 123456})
+
+
+async def items(request):
+    catalog = request.app["config"].catalog
+    ids = request.query.get("ids", "").split(",")
+    attributes = request.query.get("attributes")
+    return web.json_response([
+        {"code": 200, "body": project(full_item(i, catalog.get(i)), attributes)} for i in ids if i
+    ])
+
+
+async def product_items(request):
+    product_id = request.match_info["product_id"]
+    return web.json_response({"results": [
+        {"item_id": f"{product_id}-{n}", "seller_id": 123456 if n == 0 else 1000 + n}
+        for n in range(5)
+    ]})
+
+
+async def moderation(request):
+    return web.json_response([{"wordings": [
+        {"value": "Infraccion de prueba"},
+        {"value": "Corregir la publicacion"},
+    ]}])
+
+
+async def question(request):
+    question_id = int(request.match_info["question_id"])
+    return web.json_response({"id": question_id, "item_id": f"MLA{1000000000 + question_id % 1000}"})
+
+
+async def performance(request):
+    return web.json_response({
+        "entity_type": "ITEM",
+        "score": 80,
+        "level": "Good",
+        "level_wording": "Buena",
+        "buckets": [{"key": "CONTENT", "score": 80}],
+        "calculated_at": "2026-01-01T00:00:00Z",
+    })
+
+
+def build_app(config=None):
+    app = web.Application(middlewares=[fault_injection])
+    app["config"] = config or StubConfig()
+    app.router.add_get("/users/me", users_me)
+    app.router.add_get("/items", items)
+    app.router.add_get("/products/{product_id}/items", product_items)
+    app.router.add_get("/moderations/last_moderation/{resource}", moderation)
+    app.router.add_get("/item/{item_id}/performance", performance)
+    app.router.add_get("/questions/{question_id}", question)
+    return app
+
+
+async def start_stub(config=None, port=0):
+    """Levanta el stub en segundo plano. Devuelve (runner, base_url)."""
+    runner = web.AppRunner(build_app(config), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+    web.run_app(
+        build_app(StubConfig(args.latency, args.error_rate, args.throttle_rate, args.retry_after)),
+        host="127.0.0.1", port=args.port,
+    )
@@ -0,0 +1,96 @@
+"""
+Envia notificaciones de Meli al receptor del modo eventos (JOB_MODE=events),
+desde un archivo JSONL capturado o generadas con items "calientes" que se
+repiten, para ver cuanto se juntan en la cola con debounce.
+
+    MELI_API_URL=http://127.0.0.1:8081 MELI_STATIC_TOKEN=stub DB_DSN=mysql+pymysql://... \
+        JOB_MODE=events PORT=8080 python main.py
+    python -m benchmarks.replay_notifications --notifications 5000 --items 500 --rate 200
+    python -m benchmarks.replay_notifications --file notifications.jsonl
+
+Sin MySQL local, benchmarks.bench_events levanta el stub, el receptor sobre
+SQLite y este replay en un solo proceso.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import aiohttp
+
+
+def synthetic_notifications(count, items, questions_ratio, seed=0):
+    """Distribucion tipo Zipf: pocos items reciben la mayoria de las notificaciones."""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(items)]
+    for _ in range(count):
+        item = rng.choices(range(items), weights)[0]
+        if rng.random() < questions_ratio:
+            yield {"topic": "questions", "resource": f"/questions/{item + 1000 * rng.randint(1, 50)}",
+                   "user_id": 123456, "attempts": 1}
+        else:
+            yield {"topic": "items", "resource": f"/items/MLA{1000000000 + item}", "user_id": 123456, "attempts": 1}
+
+
+def file_notifications(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+async def replay(base_url, path, notifications, rate, timeout):
+    """Envia las notificaciones a `rate` por segundo y espera a que el receptor vacie la cola. Devuelve su /health."""
+    base_url = base_url.rstrip("/")
+    url = f"{base_url}{path}"
+    interval = 1 / rate if rate > 0 else 0
+    statuses = {}
+
+    async with aiohttp.ClientSession() as session:
+        async def send(payload):
+            async with session.post(url, json=payload) as resp:
+                statuses[resp.status] = statuses.get(resp.status, 0) + 1
+
+        start = time.perf_counter()
+        tasks = []
+        for n, payload in enumerate(notifications):
+            tasks.append(asyncio.ensure_future(send(payload)))
+            if interval:
+                await asyncio.sleep(max(0.0, start + (n + 1) * interval - time.perf_counter()))
+        await asyncio.gather(*tasks)
+        print(f"sent {len(notifications)} notifications in {time.perf_counter() - start:.2f}s, statuses: {statuses}")
+
+        # Espera a que el receptor vacie la cola (debounce incluido)
+        while True:
+            async with session.get(f"{base_url}/health") as resp:
+                health = await resp.json()
+            if health["queued"] == 0 or time.perf_counter() - start > timeout:
+                break
+            await asyncio.sleep(1)
+    return health
+
+
+async def run(args):
+    if args.file:
+        notifications = list(file_notifications(args.file))
+    else:
+        notifications = list(synthetic_notifications(args.notifications, args.items, args.questions))
+
+    health = await replay(args.url, args.path, notifications, args.rate, args.timeout)
+    print(f"receiver: {health}")
+    if health["received"]:
+        print(f"coalesced {health['coalesced'] / health['received']:.0%} of the notifications")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--path", default="/notifications")
+    parser.add_argument("--file", help="JSONL con una notificacion por linea")
+    parser.add_argument("--notifications", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=300)
+    parser.add_argument("--questions", type=float, default=0.1, help="fraccion de notificaciones de preguntas")
+    parser.add_argument("--rate", type=float, default=200, help="notificaciones por segundo (0 = sin limite)")
+    parser.add_argument("--timeout", type=float, default=120)
+    asyncio.run(run(parser.parse_args()))
@@ -1,22 +1,80 @@
 import asyncio
-from app.service.meli_api import product_status_sync
-from app.service.database import get_items_without_folder, load_item_folder_url
-from app.service.meli_performance import run_get_performance
-from app.service.google_folders import run_drive_automation
-from app.service.prepublish_api import prepublish_call_ai
-from app.settings.config import RUN_FOLDERS, RUN_PERFORMANCE
-
-product_status_sync()
-prepublish_call_ai()
-
-if RUN_PERFORMANCE == 1:
-    run_get_performance()
-
-if RUN_FOLDERS == 1:
-    items_list = get_items_without_folder()
-    if items_list:
-        data_para_db = asyncio.run(run_drive_automation(items_list))
-        print(data_para_db)
-        load_item_folder_url(data_para_db)
-else:
-    None
\ No newline at end of file
+from app.service.http_pool import http_pool
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+from app.utils.stages import Stage, StageScheduler
+from app.settings.config import RUN_FOLDERS, RUN_PERFORMANCE, STAGE_CONCURRENCY, METRICS_REPORT, METRICS_TEXTFILE, JOB_MODE, validate
+
+
+# Los modulos de cada etapa se importan cuando la etapa corre: una etapa
+# deshabilitada (o el modo events) no paga el import de sus dependencias.
+async def status_sync():
+    from app.service.meli_api import product_status_sync
+    await product_status_sync()
+
+
+async def prepublish():
+    from app.service.prepublish_api import prepublish_call_ai
+    await prepublish_call_ai()
+
+
+async def performance():
+    from app.service.meli_performance import get_performance
+    await get_performance()
+
+
+async def drive_folders():
+    from app.service.google_folders import run_drive_pipeline
+    await run_drive_pipeline()
+
+
+# Prepublish espera al status sync porque update_meli_status actualiza los meli_id;
+# performance solo necesita la lista de activos y Drive solo product_catalog_sync.
+STAGES = [
+    Stage("status_sync", status_sync),
+    Stage("prepublish", prepublish, depends_on=["status_sync"]),
+    Stage("performance", performance, enabled=RUN_PERFORMANCE == 1),
+    Stage("drive_folders", drive_folders, enabled=RUN_FOLDERS == 1),
+]
+
+
+def write_run_report():
+    logger.info("--- Run metrics ---")
+    for line in metrics.summary():
+        logger.info(line)
+    try:
+        metrics.write_report(METRICS_REPORT, METRICS_TEXTFILE)
+        logger.info(f"Run report written to {METRICS_REPORT}")
+    except OSError as e:
+        logger.error(f"Could not write run report: {e}")
+
+
+async def main():
+    """Todas las etapas corren en un solo event loop y comparten el pool HTTP."""
+    try:
+        validate()
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    if JOB_MODE == "events":
+        from app.service.notifications import run_event_mode
+        try:
+            await run_event_mode()
+        finally:
+            await http_pool.close()
+            write_run_report()
+        return
+
+    try:
+        stages = await StageScheduler(STAGES, max_concurrent=STAGE_CONCURRENCY).run()
+    finally:
+        await http_pool.close()
+        write_run_report()
+
+    failed = [name for name, stage in stages.items() if stage.error]
+    if failed:
+        raise SystemExit(f"Failed stages: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,47 @@
+"""
+Lanza N procesos de main.py como si fueran las tareas de un Cloud Run Job,
+para probar el sharding en local:
+
+    python run_shards.py --shards 4
+
+Cada proceso recibe CLOUD_RUN_TASK_INDEX/CLOUD_RUN_TASK_COUNT y el mismo RUN_ID,
+que es lo que usan los shards para coordinar los procedures post-merge.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, default=2)
+    parser.add_argument("--run-id", default=None, help="default: uno nuevo por lanzamiento")
+    args = parser.parse_args()
+
+    run_id = args.run_id or f"local-{uuid.uuid4().hex[:8]}"
+    print(f"Run {run_id}: launching {args.shards} shards")
+
+    start = time.perf_counter()
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "main.py"],
+            env={
+                **os.environ,
+                "CLOUD_RUN_TASK_INDEX": str(index),
+                "CLOUD_RUN_TASK_COUNT": str(args.shards),
+                "RUN_ID": run_id,
+            },
+        )
+        for index in range(args.shards)
+    ]
+    codes = [process.wait() for process in processes]
+
+    print(f"Finished in {time.perf_counter() - start:.2f}s, exit codes: {codes}")
+    sys.exit(max(codes, key=abs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Pruebas de la logica pura (colas, scheduler, chunks) y del indice/batch de
+Drive contra benchmarks/drive_stub.py, sin credenciales ni servicios reales.
+
+    python -m pytest -q tests
+"""
+import asyncio
+import time
+
+import aiohttp
+import pytest
+
+from app.service import drive_index, google_folders
+from app.service.credentials import StaticTokenProvider
+from app.service.drive_index import DriveFolderIndex, FOLDER_MIME
+from app.service.google_folders import create_folders_batch, parse_batch_response
+from app.service.notifications import CoalescingQueue
+from app.utils import local_store
+from app.utils.sharding import keyed_chunks
+from app.utils.stages import Stage, StageScheduler
+from benchmarks import drive_stub
+
+PARENT = "parent-folder"
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def local_state(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_store, "LOCAL_STATE_DIR", str(tmp_path))
+    return tmp_path
+
+
+async def with_drive_stub(config, test):
+    """Levanta el stub de Drive, apunta los modulos a el y corre `test(session)`."""
+    runner, url = await drive_stub.start_stub(config)
+    patch = pytest.MonkeyPatch()
+    patch.setattr(drive_index, "DRIVE_API_URL", url)
+    patch.setattr(google_folders, "DRIVE_API_URL", url)
+    patch.setattr(google_folders, "google_credentials", StaticTokenProvider("stub-token"))
+    try:
+        async with aiohttp.ClientSession() as session:
+            return await test(session)
+    finally:
+        patch.undo()
+        await runner.cleanup()
+
+
+def new_folder(config, name, parent=PARENT):
+    _, body = drive_stub.create_folder(config, {"name": name, "mimeType": FOLDER_MIME, "parents": [parent]})
+    return body["id"]
+
+
+def change_folder(config, folder_id, **fields):
+    """Modifica una carpeta del stub y registra el cambio como lo haria Drive."""
+    folder = config.folders[folder_id]
+    folder.update(fields)
+    config.changes.append({"fileId": folder_id, "removed": False, "file": dict(folder)})
+
+
+# ==========================================================
+# Drive: indice de carpetas (files.list + changes)
+# ==========================================================
+
+def test_folder_index_full_scan_then_changes_after_restart(local_state):
+    config = drive_stub.DriveStubConfig(latency=0)
+    renamed = new_folder(config, "100")
+    trashed = new_folder(config, "200")
+    moved = new_folder(config, "300")
+    kept = new_folder(config, "400")
+    new_folder(config, "999", parent="other-parent")
+    credentials = StaticTokenProvider("stub-token")
+
+    async def first_run(session):
+        index = await DriveFolderIndex(session, credentials, parent_id=PARENT).load()
+        index.save()
+        return index
+
+    index = run(with_drive_stub(config, first_run))
+    assert index.folders == {"100": renamed, "200": trashed, "300": moved, "400": kept}
+
+    # Cambios entre corridas: rename, papelera, fuera del parent y nombres duplicados
+    change_folder(config, renamed, name="101")
+    change_folder(config, trashed, trashed=True)
+    change_folder(config, moved, parents=["other-parent"])
+    duplicate = new_folder(config, "400")
+    created = new_folder(config, "500")
+
+    async def second_run(session):
+        before = config.http_requests
+        index = await DriveFolderIndex(session, credentials, parent_id=PARENT).load()
+        # Retoma desde el cache: solo la API de changes, sin files.list
+        return index, config.http_requests - before
+
+    index, requests = run(with_drive_stub(config, second_run))
+    assert requests == 1
+    assert index.folders == {"101": renamed, "400": kept, "500": created}
+    assert duplicate not in index.folders.values()
+    assert index.get(100) is None and index.get(101) == renamed
+
+
+# ==========================================================
+# Drive: batch API con partes 2xx/4xx mezcladas
+# ==========================================================
+
+def test_parse_batch_response_maps_mixed_parts():
+    body = (
+        "--b1\r\nContent-Type: application/http\r\nContent-ID: <response-item-1>\r\n\r\n"
+        "HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{\"id\": \"f1\"}\r\n"
+        "--b1\r\nContent-Type: application/http\r\nContent-ID: <response-item-2>\r\n\r\n"
+        "HTTP/1.1 403 Forbidden\r\nContent-Type: application/json\r\n\r\n{\"error\": {\"code\": 403}}\r\n"
+        "--b1\r\nContent-Type: application/http\r\nContent-ID: <response-item-3>\r\n\r\n"
+        "HTTP/1.1 204 No Content\r\n\r\n\r\n"
+        "--b1--\r\n"
+    )
+    responses = parse_batch_response(body, 'multipart/mixed; boundary="b1"')
+    assert responses == {
+        "item-1": (200, {"id": "f1"}),
+        "item-2": (403, {"error": {"code": 403}}),
+        "item-3": (204, {}),
+    }
+
+
+def test_create_folders_batch_returns_failed_item_ids(monkeypatch):
+    config = drive_stub.DriveStubConfig(latency=0)
+    create_folder = drive_stub.create_folder
+    rejected = {"11", "13"}
+
+    def partial_failure(config, payload):
+        if payload["name"] in rejected:
+            return 404, {"error": {"code": 404, "message": "Parent not found"}}
+        return create_folder(config, payload)
+
+    monkeypatch.setattr(drive_stub, "create_folder", partial_failure)
+
+    async def test(session):
+        return await create_folders_batch(session, [10, 11, 12, 13], asyncio.Semaphore(1), None)
+
+    results, failed = run(with_drive_stub(config, test))
+    assert sorted(failed) == [11, 13]
+    assert [r["item_id"] for r in results] == [10, 12]
+    folder_ids = {folder["name"]: folder_id for folder_id, folder in config.folders.items()}
+    for result in results:
+        assert result["drive_url"].endswith(folder_ids[str(result["item_id"])])
+
+
+# ==========================================================
+# CoalescingQueue
+# ==========================================================
+
+def test_queue_coalesces_and_waits_for_debounce():
+    async def test():
+        queue = CoalescingQueue(debounce=0.05, max_batch=10, max_delay=1)
+        for _ in range(3):
+            queue.put(("items", "MLA1"))
+        queue.put(("items", "MLA2"))
+        started = time.monotonic()
+        batch = await queue.next_batch()
+        return queue, batch, time.monotonic() - started
+
+    queue, batch, waited = run(test())
+    assert sorted(batch) == [("items", "MLA1"), ("items", "MLA2")]
+    assert (queue.received, queue.coalesced, len(queue)) == (4, 2, 0)
+    assert waited >= 0.04
+
+
+def test_queue_caps_debounce_with_max_delay():
+    async def test():
+        queue = CoalescingQueue(debounce=0.1, max_batch=10, max_delay=0.25)
+        started = time.monotonic()
+
+        async def keep_notifying():
+            # Notificaciones cada 50ms: solo con debounce el item no saldria nunca
+            while True:
+                queue.put(("items", "MLA1"))
+                await asyncio.sleep(0.05)
+
+        notifier = asyncio.ensure_future(keep_notifying())
+        try:
+            batch = await asyncio.wait_for(queue.next_batch(), 2)
+        finally:
+            notifier.cancel()
+        return batch, time.monotonic() - started
+
+    batch, waited = run(test())
+    assert batch == [("items", "MLA1")]
+    assert 0.2 <= waited < 0.5
+
+
+def test_queue_close_releases_pending_and_batches():
+    async def test():
+        queue = CoalescingQueue(debounce=60, max_batch=2, max_delay=60)
+        for n in range(3):
+            queue.put(("items", f"MLA{n}"))
+        queue.close()
+        return [await queue.next_batch() for _ in range(3)]
+
+    first, second, last = run(test())
+    assert len(first) == 2 and len(second) == 1
+    assert last == []
+
+
+# ==========================================================
+# StageScheduler
+# ==========================================================
+
+def test_scheduler_skips_dependents_of_failed_stages():
+    ran = []
+
+    def stage(name, fail=False):
+        async def func():
+            ran.append(name)
+            if fail:
+                raise RuntimeError(f"{name} failed")
+        return func
+
+    stages = run(StageScheduler([
+        Stage("status_sync", stage("status_sync", fail=True)),
+        Stage("prepublish", stage("prepublish"), depends_on=["status_sync"]),
+        Stage("performance", stage("performance"), enabled=False),
+        Stage("after_performance", stage("after_performance"), depends_on=["performance"]),
+        Stage("drive_folders", stage("drive_folders")),
+    ]).run())
+
+    assert sorted(ran) == ["after_performance", "drive_folders", "status_sync"]
+    assert stages["status_sync"].error == "status_sync failed"
+    assert stages["prepublish"].error.startswith("skipped")
+    assert stages["prepublish"].started is None
+    assert stages["performance"].error is None
+    assert stages["drive_folders"].error is None
+
+
+def test_scheduler_rejects_unknown_dependency():
+    with pytest.raises(ValueError):
+        StageScheduler([Stage("prepublish", None, depends_on=["missing"])])
+
+
+# ==========================================================
+# keyed_chunks
+# ==========================================================
+
+def test_keyed_chunks_groups_by_key_and_skips():
+    values = [f"MLA{n}" for n in range(10)]
+    chunks = list(keyed_chunks(values, 2, key=lambda v: int(v[3:]) % 2, skip={"MLA4"}))
+
+    assert chunks == [
+        (0, ["MLA0", "MLA2"]),
+        (1, ["MLA1", "MLA3"]),
+        (1, ["MLA5", "MLA7"]),
+        (0, ["MLA6", "MLA8"]),
+        (1, ["MLA9"]),
+    ]